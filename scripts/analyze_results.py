@@ -1,16 +1,83 @@
 """
 Analyze Results - 分析实验结果
 """
-import json
+import functools
 import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import matplotlib
+# 只输出PNG文件，使用非交互式Agg后端（无需DISPLAY，避免GUI后端初始化）
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
-plt.rcParams['axes.unicode_minus'] = False
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from utils._json import read_json as _read_json
+
+
+# 分析过程中实际读取的字段（--projection 模式下只保留这些字段）
+_PROJECTED_FIELDS = (
+    "total_tasks",
+    "success_rate",
+    "avg_steps",
+    "avg_llm_calls",
+    "cost_per_success",
+    "avg_duration",
+    "avg_repair_depth",
+    "failure_distribution",
+)
+
+
+def _project(data: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留分析所需字段，丢弃逐任务的原始数据"""
+    projected = {k: data[k] for k in _PROJECTED_FIELDS if k in data}
+    repair_depths = data.get("raw_metrics", {}).get("repair_depths")
+    if repair_depths is not None:
+        projected["raw_metrics"] = {"repair_depths": repair_depths}
+    return projected
+
+
+def _load_one(filepath: Path, projection: bool = False) -> Dict[str, Any]:
+    """加载单个结果文件"""
+    data = _read_json(filepath)
+    if projection:
+        data = _project(data)
+    return {
+        "filename": filepath.name,
+        "data": data
+    }
+
+
+# 单个实验结果的报告模板（模块加载时构建一次）
+_REPORT_TEMPLATE = "\n".join([
+    "\n实验 {i}: {filename}",
+    "-" * 80,
+    "总任务数: {total_tasks}",
+    "成功率: {success_rate:.2%}",
+    "平均步数: {avg_steps:.1f}",
+    "平均LLM调用: {avg_llm_calls:.1f}",
+    "每次成功成本: ${cost_per_success:.4f}",
+    "平均持续时间: {avg_duration:.1f}秒",
+    "平均修复深度: {avg_repair_depth:.1f}",
+])
+
+
+class _DefaultZero(dict):
+    """缺失键返回0的字典（用于报告模板的format_map）"""
+    
+    def __missing__(self, key):
+        return 0
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_cjk_font() -> None:
+    """设置中文字体（首次绘图时执行一次，避免导入时触发字体缓存构建）"""
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
+    plt.rcParams['axes.unicode_minus'] = False
 
 
 class ResultAnalyzer:
@@ -19,72 +86,77 @@ class ResultAnalyzer:
     def __init__(self, results_dir: str = "results/performance"):
         self.results_dir = Path(results_dir)
         self.results = []
+        # 按图名缓存Figure，重复绘图时清空复用而不是重新创建
+        self._figures: Dict[str, Any] = {}
+        
+    def load_results(self, pattern: str = "*.json", projection: bool = False) -> None:
+        """
+        加载结果文件
         
-    def load_results(self, pattern: str = "*.json") -> None:
-        """加载结果文件"""
+        Args:
+            pattern: 文件匹配模式
+            projection: 是否只保留分析所需字段（降低内存占用）
+        """
         result_files = list(self.results_dir.glob(pattern))
         
         print(f"找到 {len(result_files)} 个结果文件")
         
-        for filepath in result_files:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.results.append({
-                    "filename": filepath.name,
-                    "data": data
-                })
+        if not result_files:
+            return
+        
+        # 文件读取是I/O密集型，用线程池重叠磁盘I/O与解析（map保持文件顺序）
+        with ThreadPoolExecutor(max_workers=min(32, len(result_files))) as executor:
+            self.results.extend(
+                executor.map(lambda fp: _load_one(fp, projection), result_files)
+            )
     
     def compare_variants(self, variant_names: List[str] = None) -> None:
         """比较不同实验变体"""
         if not variant_names:
             variant_names = ["baseline", "graph_only", "graph_with_repair", "full_system"]
         
-        # 提取各变体的指标
-        metrics = {
-            "success_rate": [],
-            "avg_steps": [],
-            "avg_llm_calls": [],
-            "cost_per_success": []
-        }
-        
-        for result in self.results:
-            data = result["data"]
-            metrics["success_rate"].append(data.get("success_rate", 0))
-            metrics["avg_steps"].append(data.get("avg_steps", 0))
-            metrics["avg_llm_calls"].append(data.get("avg_llm_calls", 0))
-            metrics["cost_per_success"].append(data.get("cost_per_success", 0))
+        # 提取各变体的指标（单次遍历，构建 [结果, 指标] 二维数组）
+        keys = ("success_rate", "avg_steps", "avg_llm_calls", "cost_per_success")
+        arr = np.array(
+            [[result["data"].get(k, 0) for k in keys] for result in self.results],
+            dtype=np.float64
+        ).reshape(-1, len(keys))
+        # 转置为 [指标, 结果] 的连续数组，每个指标都是连续内存，绘图时无需再复制
+        metrics = dict(zip(keys, np.ascontiguousarray(arr.T)))
         
         # 绘制对比图
         self._plot_comparison(variant_names, metrics)
     
     def analyze_failures(self) -> None:
         """分析失败分布"""
-        all_failures = {}
+        all_failures = Counter()
         
         for result in self.results:
-            data = result["data"]
-            failure_dist = data.get("failure_distribution", {})
-            
-            for failure_type, count in failure_dist.items():
-                if failure_type not in all_failures:
-                    all_failures[failure_type] = 0
-                all_failures[failure_type] += count
+            all_failures.update(result["data"].get("failure_distribution", {}))
         
-        # 绘制失败分布饼图
-        self._plot_failure_distribution(all_failures)
+        # 绘制失败分布饼图（按数量降序）
+        self._plot_failure_distribution(all_failures.most_common())
     
     def analyze_repair_depth(self) -> None:
         """分析修复深度分布"""
-        all_repair_depths = []
+        # 按深度累计频次，内存占用与不同深度数成正比，而非样本总数
+        counts = np.zeros(64, dtype=np.int64)
         
         for result in self.results:
-            data = result["data"]
-            raw_metrics = data.get("raw_metrics", {})
-            repair_depths = raw_metrics.get("repair_depths", [])
-            all_repair_depths.extend(repair_depths)
+            raw_metrics = result["data"].get("raw_metrics", {})
+            depths = np.asarray(raw_metrics.get("repair_depths", []), dtype=np.float64)
+            # bincount只接受非负整数：丢弃负值与非有限值，小数深度按整数截断
+            depths = depths[np.isfinite(depths) & (depths >= 0)].astype(np.int64)
+            if not depths.size:
+                continue
+            
+            max_depth = int(depths.max())
+            if max_depth >= counts.size:
+                counts = np.concatenate([counts, np.zeros(max_depth + 1 - counts.size, dtype=np.int64)])
+            counts += np.bincount(depths, minlength=counts.size)
         
-        if all_repair_depths:
-            self._plot_repair_depth_distribution(all_repair_depths)
+        if counts.any():
+            self._plot_repair_depth_distribution(counts)
     
     def generate_report(self, output_path: str = "results/analysis_report.txt") -> None:
         """生成分析报告"""
@@ -95,18 +167,10 @@ class ResultAnalyzer:
         report_lines.append("")
         
         for i, result in enumerate(self.results, 1):
-            filename = result["filename"]
             data = result["data"]
-            
-            report_lines.append(f"\n实验 {i}: {filename}")
-            report_lines.append("-" * 80)
-            report_lines.append(f"总任务数: {data.get('total_tasks', 0)}")
-            report_lines.append(f"成功率: {data.get('success_rate', 0):.2%}")
-            report_lines.append(f"平均步数: {data.get('avg_steps', 0):.1f}")
-            report_lines.append(f"平均LLM调用: {data.get('avg_llm_calls', 0):.1f}")
-            report_lines.append(f"每次成功成本: ${data.get('cost_per_success', 0):.4f}")
-            report_lines.append(f"平均持续时间: {data.get('avg_duration', 0):.1f}秒")
-            report_lines.append(f"平均修复深度: {data.get('avg_repair_depth', 0):.1f}")
+            report_lines.append(
+                _REPORT_TEMPLATE.format_map(_DefaultZero(data, i=i, filename=result["filename"]))
+            )
             
             failure_dist = data.get('failure_distribution', {})
             if failure_dist:
@@ -118,71 +182,90 @@ class ResultAnalyzer:
         
         # 保存报告
         report_text = "\n".join(report_lines)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(report_text)
+        Path(output_path).write_text(report_text, encoding='utf-8')
         
-        print(report_text)
+        sys.stdout.write(report_text + "\n")
         print(f"\n报告已保存到: {output_path}")
     
-    def _plot_comparison(self, variant_names: List[str], metrics: Dict[str, List]) -> None:
+    def _get_figure(self, name: str, figsize: Tuple[float, float]):
+        """获取（并清空）缓存的Figure"""
+        fig = self._figures.get(name)
+        if fig is None:
+            fig = plt.figure(figsize=figsize)
+            self._figures[name] = fig
+        else:
+            fig.clf()
+        return fig
+    
+    def close_figures(self) -> None:
+        """关闭所有缓存的Figure，释放pyplot持有的引用"""
+        for fig in self._figures.values():
+            plt.close(fig)
+        self._figures.clear()
+    
+    def _plot_comparison(self, variant_names: List[str], metrics: Dict[str, np.ndarray]) -> None:
         """绘制对比图"""
-        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+        _ensure_cjk_font()
+        fig = self._get_figure("comparison", (12, 10))
+        axes = fig.subplots(2, 2)
         fig.suptitle('实验变体对比', fontsize=16)
         
-        # 成功率
-        axes[0, 0].bar(range(len(variant_names)), [m * 100 for m in metrics["success_rate"]])
-        axes[0, 0].set_title('成功率 (%)')
-        axes[0, 0].set_xticks(range(len(variant_names)))
-        axes[0, 0].set_xticklabels(variant_names, rotation=45)
-        
-        # 平均步数
-        axes[0, 1].bar(range(len(variant_names)), metrics["avg_steps"])
-        axes[0, 1].set_title('平均步数')
-        axes[0, 1].set_xticks(range(len(variant_names)))
-        axes[0, 1].set_xticklabels(variant_names, rotation=45)
-        
-        # LLM调用次数
-        axes[1, 0].bar(range(len(variant_names)), metrics["avg_llm_calls"])
-        axes[1, 0].set_title('平均LLM调用次数')
-        axes[1, 0].set_xticks(range(len(variant_names)))
-        axes[1, 0].set_xticklabels(variant_names, rotation=45)
-        
-        # 成本
-        axes[1, 1].bar(range(len(variant_names)), metrics["cost_per_success"])
-        axes[1, 1].set_title('每次成功成本 ($)')
-        axes[1, 1].set_xticks(range(len(variant_names)))
-        axes[1, 1].set_xticklabels(variant_names, rotation=45)
-        
-        plt.tight_layout()
-        plt.savefig('results/comparison.png', dpi=300, bbox_inches='tight')
+        xs = np.arange(len(variant_names))
+        panels = (
+            (metrics["success_rate"] * 100.0, '成功率 (%)'),
+            (metrics["avg_steps"], '平均步数'),
+            (metrics["avg_llm_calls"], '平均LLM调用次数'),
+            (metrics["cost_per_success"], '每次成功成本 ($)'),
+        )
+        
+        for ax, (values, title) in zip(axes.flat, panels):
+            ax.bar(xs, values)
+            ax.set_title(title)
+            ax.set_xticks(xs)
+            ax.set_xticklabels(variant_names)
+            ax.tick_params(axis='x', labelrotation=45)
+        
+        fig.tight_layout()
+        fig.savefig('results/comparison.png', dpi=300, bbox_inches='tight')
         print("对比图已保存: results/comparison.png")
     
-    def _plot_failure_distribution(self, failures: Dict[str, int]) -> None:
+    def _plot_failure_distribution(self, failures: List[Tuple[str, int]]) -> None:
         """绘制失败分布饼图"""
         if not failures:
             return
         
-        labels = list(failures.keys())
-        sizes = list(failures.values())
+        _ensure_cjk_font()
+        labels, sizes = zip(*failures)
         
-        plt.figure(figsize=(10, 8))
-        plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-        plt.title('失败类型分布')
-        plt.axis('equal')
+        fig = self._get_figure("failure_distribution", (10, 8))
+        ax = fig.add_subplot()
+        ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
+        ax.set_title('失败类型分布')
+        ax.axis('equal')
         
-        plt.savefig('results/failure_distribution.png', dpi=300, bbox_inches='tight')
+        fig.savefig('results/failure_distribution.png', dpi=300, bbox_inches='tight')
         print("失败分布图已保存: results/failure_distribution.png")
     
-    def _plot_repair_depth_distribution(self, repair_depths: List[int]) -> None:
-        """绘制修复深度分布"""
-        plt.figure(figsize=(10, 6))
-        plt.hist(repair_depths, bins=range(max(repair_depths) + 2), edgecolor='black')
-        plt.title('修复深度分布')
-        plt.xlabel('修复深度')
-        plt.ylabel('频次')
-        plt.grid(axis='y', alpha=0.3)
+    def _plot_repair_depth_distribution(self, counts: np.ndarray) -> None:
+        """
+        绘制修复深度分布
+        
+        Args:
+            counts: 各修复深度的频次，下标即深度
+        """
+        _ensure_cjk_font()
+        # 去掉末尾的零频次深度
+        counts = counts[:int(np.flatnonzero(counts)[-1]) + 1]
+        
+        fig = self._get_figure("repair_depth_distribution", (10, 6))
+        ax = fig.add_subplot()
+        ax.bar(np.arange(counts.size), counts, width=1.0, align='edge', edgecolor='black')
+        ax.set_title('修复深度分布')
+        ax.set_xlabel('修复深度')
+        ax.set_ylabel('频次')
+        ax.grid(axis='y', alpha=0.3)
         
-        plt.savefig('results/repair_depth_distribution.png', dpi=300, bbox_inches='tight')
+        fig.savefig('results/repair_depth_distribution.png', dpi=300, bbox_inches='tight')
         print("修复深度分布图已保存: results/repair_depth_distribution.png")
 
 
@@ -193,28 +276,32 @@ def main():
     parser = argparse.ArgumentParser(description="分析实验结果")
     parser.add_argument("--results-dir", default="results/performance", help="结果目录")
     parser.add_argument("--pattern", default="*.json", help="文件匹配模式")
+    parser.add_argument("--projection", action="store_true", help="只加载分析所需字段")
     
     args = parser.parse_args()
     
     analyzer = ResultAnalyzer(results_dir=args.results_dir)
-    analyzer.load_results(pattern=args.pattern)
+    analyzer.load_results(pattern=args.pattern, projection=args.projection)
     
     if not analyzer.results:
         print("未找到结果文件")
         return
     
-    # 生成报告
-    analyzer.generate_report()
-    
-    # 分析失败
-    analyzer.analyze_failures()
-    
-    # 分析修复深度
-    analyzer.analyze_repair_depth()
-    
-    # 对比变体（如果有多个结果）
-    if len(analyzer.results) > 1:
-        analyzer.compare_variants()
+    try:
+        # 生成报告
+        analyzer.generate_report()
+        
+        # 分析失败
+        analyzer.analyze_failures()
+        
+        # 分析修复深度
+        analyzer.analyze_repair_depth()
+        
+        # 对比变体（如果有多个结果）
+        if len(analyzer.results) > 1:
+            analyzer.compare_variants()
+    finally:
+        analyzer.close_figures()
 
 
 if __name__ == "__main__":
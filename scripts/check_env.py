@@ -9,15 +9,17 @@ print("=" * 60)
 print("检查环境变量")
 print("=" * 60)
 
+env = dict(os.environ)
+
 # 检查 DEEPSEEK_API_KEY
-deepseek_key = os.environ.get("DEEPSEEK_API_KEY")
+deepseek_key = env.get("DEEPSEEK_API_KEY")
 if deepseek_key:
     print(f"[OK] DEEPSEEK_API_KEY: {deepseek_key[:10]}...")
 else:
     print("[SKIP] DEEPSEEK_API_KEY 未设置")
 
 # 检查 QWEN_API_KEY
-qwen_key = os.environ.get("QWEN_API_KEY")
+qwen_key = env.get("QWEN_API_KEY")
 if qwen_key:
     print(f"[OK] QWEN_API_KEY: {qwen_key[:10]}...")
 else:
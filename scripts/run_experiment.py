@@ -2,13 +2,23 @@
 Main Experiment Runner - 主实验运行脚本
 """
 import sys
+import time
 import yaml
-import json
 from pathlib import Path
 from datetime import datetime
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover - 未编译LibYAML时使用纯Python加载器
+    from yaml import SafeLoader
+
+# 项目根目录（scripts的父目录）
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TASK_GRAPHS_DIR = PROJECT_ROOT / "results" / "task_graphs"
+PERF_DIR = PROJECT_ROOT / "results" / "performance"
+
 # 添加src到路径
-sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
 
 from task_compiler.compiler import TaskCompiler
 from task_compiler.validator import GraphValidator
@@ -19,6 +29,7 @@ from local_repair.rollback import RollbackManager, EnvironmentReset, NoProgressD
 from router.router import CostAwareRouter
 from utils.logger import TaskLogger, MetricsCollector
 from utils.data_loader import DatasetLoader
+from utils._json import dumps as _dumps
 from models.model_loader import ModelLoader
 from models.browser_env import PlaywrightBrowser
 
@@ -29,20 +40,21 @@ class ExperimentRunner:
     def __init__(self, config_path: str = "config/default_params.yaml"):
         # 确保使用项目根目录的路径
         if not Path(config_path).is_absolute():
-            # 获取项目根目录（scripts的父目录）
-            project_root = Path(__file__).parent.parent
-            config_path = project_root / config_path
+            config_path = PROJECT_ROOT / config_path
         
         # 加载配置
         with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+            self.config = yaml.load(f, Loader=SafeLoader)
+        
+        # 输出目录只需创建一次
+        TASK_GRAPHS_DIR.mkdir(parents=True, exist_ok=True)
+        PERF_DIR.mkdir(parents=True, exist_ok=True)
         
         # 初始化组件
         # 使用项目根目录的路径
-        project_root = Path(__file__).parent.parent
         log_dir = self.config.get("logging", {}).get("log_dir", "results/logs")
         if not Path(log_dir).is_absolute():
-            log_dir = project_root / log_dir
+            log_dir = PROJECT_ROOT / log_dir
             
         self.logger = TaskLogger(
             log_dir=str(log_dir),
@@ -89,10 +101,13 @@ class ExperimentRunner:
         self.router = CostAwareRouter(config=router_config)
         
         # 回滚管理器
-        self.rollback_manager = RollbackManager(max_checkpoints=10)
+        system_config = self.config.get("system", {})
+        self.rollback_manager = RollbackManager(
+            max_checkpoints=10,
+            background_copy=system_config.get("background_checkpoint", False)
+        )
         
         # 图执行器（集成路由器和回滚管理器）
-        system_config = self.config.get("system", {})
         self.executor = GraphExecutor(
             browser_env=self.browser,
             verifier=self.verifier,
@@ -190,12 +205,11 @@ class ExperimentRunner:
         if not failed_node_id:
             return initial_result
         
+        # 节点ID -> 节点 索引（本次修复内复用，不写入任务图）
+        id_index = {n["id"]: n for n in task_graph["nodes"]}
+        
         # 获取失败节点
-        failed_node = None
-        for node in task_graph["nodes"]:
-            if node["id"] == failed_node_id:
-                failed_node = node
-                break
+        failed_node = id_index.get(failed_node_id)
         
         if not failed_node:
             return initial_result
@@ -267,7 +281,7 @@ class ExperimentRunner:
             
             # 步骤4: 重新执行子图
             self.logger.logger.info(f"重新执行子图: {rollback_subgraph}")
-            result = self._execute_subgraph(task_graph, rollback_subgraph)
+            result = self._execute_subgraph(task_graph, rollback_subgraph, id_index)
             
             if result["success"]:
                 self.logger.logger.info("修复成功！")
@@ -280,22 +294,26 @@ class ExperimentRunner:
         self.logger.logger.warning("所有修复尝试均失败")
         return initial_result
     
-    def _execute_subgraph(self, task_graph: dict, subgraph_nodes: list) -> dict:
+    def _execute_subgraph(self, task_graph: dict, subgraph_nodes: list, id_index: dict = None) -> dict:
         """
         执行子图
         
         Args:
             task_graph: 完整任务图
             subgraph_nodes: 需要执行的节点ID列表
+            id_index: 可选，调用方已构建的 节点ID -> 节点 索引
             
         Returns:
             执行结果
         """
         # 创建子图
+        if id_index is None:
+            id_index = {n["id"]: n for n in task_graph["nodes"]}
+        sub_set = set(subgraph_nodes)
         subgraph = {
             "task_id": task_graph.get("task_id") + "_subgraph",
-            "nodes": [n for n in task_graph["nodes"] if n["id"] in subgraph_nodes],
-            "edges": [e for e in task_graph["edges"] if e[0] in subgraph_nodes and e[1] in subgraph_nodes],
+            "nodes": [id_index[nid] for nid in subgraph_nodes if nid in id_index],
+            "edges": [e for e in task_graph["edges"] if e[0] in sub_set and e[1] in sub_set],
             "metadata": task_graph.get("metadata", {})
         }
         
@@ -314,9 +332,10 @@ class ExperimentRunner:
             self.browser.clear_cookies()
             self.browser.clear_local_storage()
             
-            # 恢复cookies
-            for cookie in browser_state.get("cookies", []):
-                self.browser.set_cookie(cookie)
+            # 恢复cookies（一次批量调用）
+            cookies = browser_state.get("cookies", [])
+            if cookies:
+                self.browser.set_cookies(cookies)
             
             # 导航到保存的URL
             url = browser_state.get("url")
@@ -330,14 +349,8 @@ class ExperimentRunner:
     def _save_task_graph(self, task_graph: dict) -> None:
         """保存任务图"""
         task_id = task_graph.get("task_id", "unknown")
-        # 使用项目根目录
-        project_root = Path(__file__).parent.parent
-        output_dir = project_root / "results" / "task_graphs"
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        filepath = output_dir / f"{task_id}.json"
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(task_graph, f, indent=2, ensure_ascii=False)
+        filepath = TASK_GRAPHS_DIR / f"{task_id}.json"
+        filepath.write_bytes(_dumps(task_graph))
     
     def run_experiment(
         self, 
@@ -355,12 +368,11 @@ class ExperimentRunner:
         """
         # 确保使用项目根目录的路径
         if not Path(experiment_config_path).is_absolute():
-            project_root = Path(__file__).parent.parent
-            experiment_config_path = project_root / experiment_config_path
+            experiment_config_path = PROJECT_ROOT / experiment_config_path
         
         # 加载实验配置
         with open(experiment_config_path, 'r', encoding='utf-8') as f:
-            exp_config = yaml.safe_load(f)
+            exp_config = yaml.load(f, Loader=SafeLoader)
         
         experiment_name = exp_config.get("experiment", {}).get("name", "experiment")
         benchmark = benchmark or exp_config.get("experiment", {}).get("benchmark", "miniwob")
@@ -391,26 +403,31 @@ class ExperimentRunner:
         
         self.logger.logger.info(f"成功加载 {len(tasks)} 个任务")
         
-        # 运行所有任务
-        results = []
+        # 任务间休眠时间（秒），默认不休眠
+        inter_task_sleep = exp_config.get("experiment", {}).get("inter_task_sleep", 0)
+        
+        # 运行所有任务，每个任务完成后立即追加写入结果文件（JSONL）
+        experiment_id = f"{experiment_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         for i, task in enumerate(tasks, 1):
-            self.logger.logger.info(f"\n{'='*60}")
-            self.logger.logger.info(f"任务 {i}/{len(tasks)}: {task['task_id']}")
-            self.logger.logger.info(f"类别: {task.get('category', 'unknown')}")
-            self.logger.logger.info(f"难度: {task.get('difficulty', 'unknown')}")
-            self.logger.logger.info(f"{'='*60}")
+            self.logger.logger.info(
+                f"\n{'='*60}\n"
+                f"任务 {i}/{len(tasks)}: {task['task_id']}\n"
+                f"类别: {task.get('category', 'unknown')}\n"
+                f"难度: {task.get('difficulty', 'unknown')}\n"
+                f"{'='*60}"
+            )
             
             task_instruction = task['instruction']
             start_url = task.get('start_url')
             env_id = task.get('metadata', {}).get('env_id') if isinstance(task.get('metadata'), dict) else None
 
             # 将数据集上下文附加到任务描述，帮助编译器生成更可执行的图
-            context_lines = []
-            if env_id:
-                context_lines.append(f"环境ID: {env_id}")
-            if start_url:
-                context_lines.append(f"起始URL: {start_url}")
-            if context_lines:
+            if env_id or start_url:
+                context_lines = []
+                if env_id:
+                    context_lines.append(f"环境ID: {env_id}")
+                if start_url:
+                    context_lines.append(f"起始URL: {start_url}")
                 task_instruction = f"{task_instruction}\n\n" + "\n".join(context_lines)
 
             result = self.run_task(
@@ -425,21 +442,23 @@ class ExperimentRunner:
                 'benchmark': task.get('benchmark')
             }
             
-            results.append(result)
+            self.data_loader.append_result(
+                result,
+                benchmark=benchmark,
+                experiment_id=experiment_id,
+                variant="full_system"
+            )
             
-            # 短暂休息
-            import time
-            time.sleep(1)
+            if inter_task_sleep:
+                time.sleep(inter_task_sleep)
         
         # 保存实验结果
-        self._save_experiment_results(experiment_name, benchmark, results)
+        self._save_experiment_results(experiment_name, benchmark, experiment_id)
     
-    def _save_experiment_results(self, experiment_name: str, benchmark: str, results: list):
+    def _save_experiment_results(self, experiment_name: str, benchmark: str, experiment_id: str):
         """保存实验结果"""
-        # 使用数据加载器保存结果
-        experiment_id = f"{experiment_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        self.data_loader.save_results(
-            results=results,
+        # 结果已逐条写入JSONL，这里汇总为完整的结果文件
+        self.data_loader.finalize_results(
             benchmark=benchmark,
             experiment_id=experiment_id,
             variant="full_system"
@@ -447,13 +466,8 @@ class ExperimentRunner:
         
         summary = self.metrics_collector.get_summary()
         
-        # 使用项目根目录
-        project_root = Path(__file__).parent.parent
-        output_dir = project_root / "results" / "performance"
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filepath = output_dir / f"{experiment_name}_{timestamp}.json"
+        filepath = PERF_DIR / f"{experiment_name}_{timestamp}.json"
         
         self.metrics_collector.save_metrics(str(filepath))
         
@@ -474,6 +488,7 @@ class ExperimentRunner:
         """清理资源"""
         if self.browser:
             self.browser.close()
+        self.logger.close()
 
 
 def main():
@@ -499,7 +514,10 @@ def main():
             # 运行单个任务
             result = runner.run_task(args.task, use_repair=not args.no_repair)
             print("\n任务结果:")
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            sys.stdout.flush()
+            # 直接写入字节缓冲区，跳过文本层编码
+            sys.stdout.buffer.write(_dumps(result) + b"\n")
+            sys.stdout.buffer.flush()
         else:
             # 运行完整实验
             runner.run_experiment(
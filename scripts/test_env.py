@@ -15,27 +15,14 @@ print("=" * 60)
 print("环境变量诊断")
 print("=" * 60)
 
-# 方法1: os.environ.get()
-deepseek_key_1 = os.environ.get("DEEPSEEK_API_KEY")
-print(f"\n方法1 - os.environ.get():")
-print(f"  DEEPSEEK_API_KEY = {deepseek_key_1}")
+# 读取一次环境变量快照（os.environ.get / os.getenv / os.environ[] 查询的是同一个字典）
+env = dict(os.environ)
+deepseek_key = env.get("DEEPSEEK_API_KEY")
+print(f"\n进程环境变量:")
+print(f"  DEEPSEEK_API_KEY = {deepseek_key if deepseek_key is not None else '[未找到]'}")
 
-# 方法2: os.getenv()
-deepseek_key_2 = os.getenv("DEEPSEEK_API_KEY")
-print(f"\n方法2 - os.getenv():")
-print(f"  DEEPSEEK_API_KEY = {deepseek_key_2}")
-
-# 方法3: 直接访问 os.environ
-try:
-    deepseek_key_3 = os.environ["DEEPSEEK_API_KEY"]
-    print(f"\n方法3 - os.environ[]:")
-    print(f"  DEEPSEEK_API_KEY = {deepseek_key_3}")
-except KeyError:
-    print(f"\n方法3 - os.environ[]:")
-    print(f"  DEEPSEEK_API_KEY = [未找到]")
-
-# 方法4: 使用 python-dotenv
-print(f"\n方法4 - python-dotenv:")
+# 使用 python-dotenv
+print(f"\npython-dotenv:")
 try:
     from dotenv import load_dotenv
     print("  [OK] python-dotenv 已安装")
@@ -55,19 +42,17 @@ except ImportError:
 
 # 打印所有环境变量（查找 DEEPSEEK）
 print(f"\n所有包含 'DEEPSEEK' 的环境变量:")
-found = False
-for key, value in os.environ.items():
-    if "DEEPSEEK" in key.upper():
-        print(f"  {key} = {value}")
-        found = True
-if not found:
+deepseek_vars = {k: v for k, v in env.items() if "DEEPSEEK" in k.upper()}
+for key, value in deepseek_vars.items():
+    print(f"  {key} = {value}")
+if not deepseek_vars:
     print("  [未找到]")
 
 print("\n" + "=" * 60)
 print("诊断建议")
 print("=" * 60)
 
-if not deepseek_key_1 and not deepseek_key_2:
+if not deepseek_key:
     print("\n环境变量未读取到，可能的原因：")
     print("1. 设置环境变量后未重启 PowerShell")
     print("2. 环境变量设置在 User 级别，当前进程未刷新")
@@ -79,5 +64,5 @@ if not deepseek_key_1 and not deepseek_key_2:
     print("\n方案3 - 重启 PowerShell 后再试")
 else:
     print("\n[OK] 环境变量读取成功！")
-    print(f"  密钥前缀: {deepseek_key_1[:10] if deepseek_key_1 else 'N/A'}...")
+    print(f"  密钥前缀: {deepseek_key[:10]}...")
 
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """测试DeepSeek和Qwen配置"""
 
+import functools
 import sys
 from pathlib import Path
 
@@ -9,10 +10,15 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 from models.model_loader import ModelLoader
 
+@functools.lru_cache(maxsize=1)
+def _get_loader():
+    """进程内共享的ModelLoader（只加载一次.env与API密钥）"""
+    return ModelLoader()
+
 def test_deepseek():
     """测试DeepSeek"""
     print("\n=== 测试 DeepSeek ===")
-    loader = ModelLoader()
+    loader = _get_loader()
     
     if not loader.deepseek_api_key:
         print("[SKIP] DeepSeek API密钥未配置")
@@ -32,7 +38,7 @@ def test_deepseek():
 def test_qwen():
     """测试Qwen"""
     print("\n=== 测试 Qwen ===")
-    loader = ModelLoader()
+    loader = _get_loader()
     
     if not loader.qwen_api_key:
         print("[SKIP] Qwen API密钥未配置")
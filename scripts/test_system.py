@@ -2,7 +2,10 @@
 Simple Test - 简单测试脚本
 用于验证系统基本功能
 """
+import io
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 添加src到路径
@@ -157,6 +160,51 @@ def test_cost_router():
     return True
 
 
+class _ThreadLocalStdout:
+    """按线程重定向 print 输出，使并发执行的测试日志可以按固定顺序打印"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+        
+    def _target(self):
+        return getattr(self._local, "buffer", None) or self._stream
+        
+    def write(self, text):
+        return self._target().write(text)
+        
+    def flush(self):
+        self._target().flush()
+        
+    def run_captured(self, test):
+        """在当前线程执行测试并捕获其输出，返回 (输出, 异常或None)"""
+        self._local.buffer = io.StringIO()
+        try:
+            test()
+            return self._local.buffer.getvalue(), None
+        except Exception as e:
+            return self._local.buffer.getvalue(), e
+        finally:
+            self._local.buffer = None
+
+
+def _run_independent_tests(tests):
+    """并发执行互不依赖的测试，按列表顺序输出日志"""
+    stdout = _ThreadLocalStdout(sys.stdout)
+    sys.stdout = stdout
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(stdout.run_captured, test) for test in tests]
+            outcomes = [future.result() for future in futures]
+    finally:
+        sys.stdout = stdout._stream
+        
+    for output, error in outcomes:
+        sys.stdout.write(output)
+        if error is not None:
+            raise error
+
+
 def main():
     """主测试函数"""
     print("\n" + "=" * 60)
@@ -172,14 +220,8 @@ def main():
             print("\n[FAIL] 测试失败")
             return
         
-        # 测试3: 双路验证
-        test_dual_verifier()
-        
-        # 测试4: 修复引擎
-        test_repair_engine()
-        
-        # 测试5: 成本路由
-        test_cost_router()
+        # 测试3-5: 双路验证、修复引擎、成本路由互不依赖，并发执行
+        _run_independent_tests([test_dual_verifier, test_repair_engine, test_cost_router])
         
         print("\n" + "=" * 60)
         print("[SUCCESS] 所有测试通过！")
@@ -8,6 +8,11 @@ __version__ = "1.0.0"
 __author__ = "Your Name"
 __email__ = "your-email@example.com"
 
+import logging
+
+# 作为库使用时默认不输出日志，由调用方（如 TaskLogger）配置处理器
+logging.getLogger("GraphWebAgent").addHandler(logging.NullHandler())
+
 from .task_compiler.compiler import TaskCompiler
 from .task_compiler.validator import GraphValidator
 from .graph_executor.executor import GraphExecutor
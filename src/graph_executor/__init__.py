@@ -1,7 +1,8 @@
 # Graph Executor Module
 from .executor import GraphExecutor, NodeStatus, ExecutionContext
 from .dual_verifier import DualVerifier, VerificationResult
+from .soft_cache import SemanticCache, PersistentSemanticCache
 
-__all__ = ["GraphExecutor", "NodeStatus", "ExecutionContext", "DualVerifier", "VerificationResult"]
+__all__ = ["GraphExecutor", "NodeStatus", "ExecutionContext", "DualVerifier", "VerificationResult", "SemanticCache", "PersistentSemanticCache"]
 
 
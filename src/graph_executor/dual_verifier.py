@@ -3,12 +3,21 @@ Dual-path Verification - 双路验证机制
 """
 from typing import Dict, Any, Tuple
 from dataclasses import dataclass
+import logging
 import re
 
 
-@dataclass
+# 挂在 TaskLogger 的 "GraphWebAgent" 日志器下，随其处理器输出
+logger = logging.getLogger("GraphWebAgent.verifier")
+
+# 谓词中的URL/标题断言，例如 "URL包含/search"、"标题等于'首页'"
+_URL_RE = re.compile(r'URL(?:包含|匹配|等于)\s*["\']?([^"\']+)["\']?')
+_TITLE_RE = re.compile(r'标题(?:包含|匹配|等于)\s*["\']?([^"\']+)["\']?')
+
+
+@dataclass(slots=True, frozen=True)
 class VerificationResult:
-    """验证结果"""
+    """验证结果（不可变，使用__slots__减少每个实例的内存占用）"""
     confidence: float  # 总置信度 [0, 1]
     hard_score: float  # 硬验证分数
     soft_score: float  # 软验证分数
@@ -31,7 +40,15 @@ class VerificationResult:
 class DualVerifier:
     """双路验证器"""
     
-    def __init__(self, config: Dict = None, llm_client=None):
+    def __init__(self, config: Dict = None, llm_client=None, embedder=None, cache=None):
+        """
+        Args:
+            config: 验证配置
+            llm_client: 软验证使用的LLM客户端
+            embedder: 文本嵌入模型（需提供 encode(text) 方法），用于软验证语义缓存
+            cache: 软验证缓存；提供embedder但未提供cache时自动创建，
+                配置了 soft_cache_path 时使用持久化的 PersistentSemanticCache
+        """
         self.config = config or {}
         self.llm_client = llm_client
         
@@ -40,6 +57,49 @@ class DualVerifier:
         self.w_soft = self.config.get("soft_check_weight", 0.3)
         self.w_consistency = self.config.get("consistency_weight", 0.1)
         self.threshold = self.config.get("confidence_threshold", 0.7)
+        # 是否为每个节点生成专用的硬验证/一致性打分函数（关闭时走通用路径）
+        self.specialize_checks = self.config.get("specialize_checks", True)
+        
+        # 软验证语义缓存
+        self.embedder = embedder
+        if cache is None and embedder is not None:
+            threshold = self.config.get("soft_cache_threshold", 0.87)
+            quantize = self.config.get("soft_cache_quantize", False)
+            cache_path = self.config.get("soft_cache_path")
+            if cache_path:
+                from .soft_cache import PersistentSemanticCache
+                cache = PersistentSemanticCache(
+                    cache_path,
+                    ttl=self.config.get("soft_cache_ttl"),
+                    threshold=threshold,
+                    namespace=getattr(llm_client, "model_name", ""),
+                    quantize=quantize
+                )
+            else:
+                from .soft_cache import SemanticCache
+                cache = SemanticCache(threshold=threshold, quantize=quantize)
+        self.soft_cache = cache
+        
+        # 节点ID -> (节点, 谓词原文, 专用打分函数)，见 _structural_checks
+        self._node_checks: Dict[Any, Tuple[Dict, str, Any]] = {}
+        # 节点ID -> (谓词原文, URL断言, 标题断言)，见 _predicate_patterns
+        self._pattern_cache: Dict[Any, Tuple[str, list, list]] = {}
+        # page_state字段 -> 最近一次的 (原值, 小写值)，见 _lowered
+        self._lowered_cache: Dict[str, Tuple[str, str]] = {}
+        
+        # 按节点类型分派的打分函数
+        self._type_scorers = {
+            "NAVIGATE": self._score_navigate,
+            "COLLECT": self._score_collect,
+            "EXTRACT": self._score_extract,
+            "ACT": self._score_act,
+        }
+        self._consistency_scorers = {
+            "EXTRACT": self._consistency_extract,
+            "COLLECT": self._consistency_collect,
+            "COMPUTE": self._consistency_compute,
+            "NAVIGATE": self._consistency_navigate,
+        }
         
     def verify(self, node: Dict, page_state: Dict, model_tier=None) -> VerificationResult:
         """
@@ -52,20 +112,25 @@ class DualVerifier:
         Returns:
             验证结果
         """
-        node_type = node.get("type")
-        
-        # 1. 硬验证（结构验证）
-        hard_score = self._hard_check(node, page_state)
+        # 1. 硬验证（结构验证）与 3. 一致性验证
+        hard_score, consistency_score = self._structural_checks(node, page_state)
         
         # 2. 软验证（语义验证）- 根据路由决策选择是否使用LLM
-        if model_tier and hasattr(model_tier, 'value') and model_tier.value == "no_llm":
+        if self._is_no_llm(model_tier):
             soft_score = 0.0  # 不使用LLM时软验证分数为0
         else:
             soft_score = self._soft_check(node, page_state)
         
-        # 3. 一致性验证
-        consistency_score = self._consistency_check(node, page_state)
-        
+        return self._build_result(node, hard_score, soft_score, consistency_score)
+    
+    @staticmethod
+    def _is_no_llm(model_tier) -> bool:
+        """路由决策是否为不使用LLM"""
+        return bool(model_tier) and hasattr(model_tier, 'value') and model_tier.value == "no_llm"
+    
+    def _build_result(self, node: Dict, hard_score: float, soft_score: float,
+                      consistency_score: float) -> VerificationResult:
+        """汇总三路分数为验证结果"""
         # 计算总置信度
         confidence = (
             self.w_hard * hard_score +
@@ -83,11 +148,70 @@ class DualVerifier:
             passed=passed,
             details={
                 "node_id": node.get("id"),
-                "node_type": node_type,
+                "node_type": node.get("type"),
                 "threshold": self.threshold
             }
         )
     
+    def _structural_checks(self, node: Dict, page_state: Dict) -> Tuple[float, float]:
+        """
+        计算 (硬验证分数, 一致性分数)，优先使用节点专用的打分函数
+        
+        专用函数按节点ID缓存在验证器上（闭包不可序列化，不能写入任务图）；
+        节点被替换或谓词被修复改写后重新生成。
+        """
+        if not self.specialize_checks:
+            return self._hard_check(node, page_state), self._consistency_check(node, page_state)
+            
+        predicate = node.get("predicate") or ""
+        cached = self._node_checks.get(node.get("id"))
+        if cached is not None and cached[0] is node and cached[1] == predicate:
+            checks = cached[2]
+        else:
+            checks = self._specialize(node)
+            self._node_checks[node.get("id")] = (node, predicate, checks)
+        return checks(page_state)
+    
+    def _specialize(self, node: Dict):
+        """
+        为节点生成专用打分函数 page_state -> (硬验证分数, 一致性分数)
+        
+        节点的谓词断言、类型和参数在编译后不再变化，这里一次性解析并固化进闭包，
+        每次验证只执行该节点实际需要的子检查。打分规则与 _hard_check / _consistency_check 一致。
+        """
+        url_patterns, title_patterns = self._predicate_patterns(node)
+        needs_dom = bool(node.get("params", {}).get("required_elements"))
+        type_scorer = self._type_scorers.get(node.get("type"))
+        consistency_scorer = self._consistency_scorers.get(node.get("type"))
+        if node.get("type") == "EXTRACT":
+            expected_fields = frozenset(node.get("params", {}).get("fields", []))
+            consistency_scorer = lambda n, ps: self._consistency_extract(n, ps, expected_fields)
+        lowered = self._lowered
+        
+        def checks(page_state: Dict) -> Tuple[float, float]:
+            score = 0.0
+            
+            if url_patterns:
+                current_url = lowered(page_state, "url")
+                if current_url and any(p in current_url for p in url_patterns):
+                    score += 0.2
+                    
+            if title_patterns:
+                page_title = lowered(page_state, "title")
+                if page_title and any(p in page_title for p in title_patterns):
+                    score += 0.15
+                    
+            if not needs_dom or len(page_state.get("dom_elements", [])) > 0:
+                score += 0.15
+                
+            if type_scorer is not None:
+                score += type_scorer(page_state)
+                
+            consistency = consistency_scorer(node, page_state) if consistency_scorer is not None else 0.0
+            return min(score, 0.6), consistency
+            
+        return checks
+    
     def _hard_check(self, node: Dict, page_state: Dict) -> float:
         """
         硬验证 - 结构验证
@@ -103,19 +227,17 @@ class DualVerifier:
         """
         score = 0.0
         max_score = 0.6
-        node_type = node.get("type")
-        predicate = node.get("predicate", "")
         
-        current_url = page_state.get("url", "")
-        page_title = page_state.get("title", "")
+        # 各子项分值之和恰为max_score，只有全部通过才会达到上限，
+        # 因此提前返回无法省去任何子检查；每个子项的得分都计入置信度，也不能跳过
         dom_elements = page_state.get("dom_elements", [])
         
         # URL检查 (0.2分)
-        if self._check_url_pattern(predicate, current_url):
+        if self._check_url_pattern(node, page_state):
             score += 0.2
             
         # 页面标题检查 (0.15分)
-        if self._check_title_match(predicate, page_title):
+        if self._check_title_match(node, page_state):
             score += 0.15
             
         # DOM元素检查 (0.15分)
@@ -123,22 +245,37 @@ class DualVerifier:
             score += 0.15
             
         # 节点类型特定检查 (0.1分)
-        if node_type == "NAVIGATE":
-            if current_url and current_url != "about:blank":
-                score += 0.1
-        elif node_type == "COLLECT":
-            if len(dom_elements) > 0:
-                score += 0.1
-        elif node_type == "EXTRACT":
-            if page_state.get("extracted_data"):
-                score += 0.1
-        elif node_type == "ACT":
-            # 检查操作是否改变了页面状态
-            if page_state.get("state_changed", False):
-                score += 0.1
+        scorer = self._type_scorers.get(node.get("type"))
+        if scorer is not None:
+            score += scorer(page_state)
                 
         return min(score, max_score)
     
+    @staticmethod
+    def _score_navigate(page_state: Dict) -> float:
+        """NAVIGATE: 已导航到非空白页面"""
+        current_url = page_state.get("url", "")
+        return 0.1 if current_url and current_url != "about:blank" else 0.0
+    
+    @staticmethod
+    def _score_collect(page_state: Dict) -> float:
+        """COLLECT: 页面存在DOM元素"""
+        return 0.1 if len(page_state.get("dom_elements", [])) > 0 else 0.0
+    
+    @staticmethod
+    def _score_extract(page_state: Dict) -> float:
+        """EXTRACT: 已提取到数据"""
+        return 0.1 if page_state.get("extracted_data") else 0.0
+    
+    @staticmethod
+    def _score_act(page_state: Dict) -> float:
+        """ACT: 操作改变了页面状态"""
+        return 0.1 if page_state.get("state_changed", False) else 0.0
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取软验证缓存统计（未启用缓存时为空）"""
+        return self.soft_cache.get_stats() if self.soft_cache is not None else {}
+    
     def _soft_check(self, node: Dict, page_state: Dict) -> float:
         """
         软验证 - 语义验证
@@ -152,6 +289,24 @@ class DualVerifier:
             # 如果没有LLM，使用简单的关键词匹配
             return self._simple_semantic_check(node, page_state)
             
+        prompt, embedding, cached = self._prepare_soft_check(node, page_state)
+        if cached is not None:
+            return cached * 0.3
+        
+        try:
+            response = self.llm_client.generate(prompt, max_tokens=50)
+            return self._finish_soft_check(response, embedding)
+        except Exception as e:
+            logger.warning("软验证失败: %s", e)
+            return 0.0
+    
+    def _prepare_soft_check(self, node: Dict, page_state: Dict) -> Tuple[str, Any, Any]:
+        """
+        构造软验证prompt并查询语义缓存
+        
+        Returns:
+            (prompt, 嵌入向量或None, 缓存命中的置信度或None)
+        """
         goal = node.get("goal", "")
         page_content = page_state.get("text_content", "")
         
@@ -165,13 +320,21 @@ class DualVerifier:
 
 格式: 是/否, 置信度"""
 
-        try:
-            response = self.llm_client.generate(prompt, max_tokens=50)
-            confidence = self._parse_soft_check_response(response)
-            return confidence * 0.3  # 最大0.3分
-        except Exception as e:
-            print(f"软验证失败: {e}")
-            return 0.0
+        # 语义缓存：相似的(目标, 页面)组合直接复用之前的置信度
+        embedding = None
+        cached = None
+        if self.embedder is not None and self.soft_cache is not None:
+            embedding = self.embedder.encode(f"{goal} || {page_content[:500]}")
+            cached = self.soft_cache.get(embedding)
+            
+        return prompt, embedding, cached
+    
+    def _finish_soft_check(self, response: str, embedding) -> float:
+        """解析LLM响应、写入缓存并换算为软验证分数"""
+        confidence = self._parse_soft_check_response(response)
+        if embedding is not None:
+            self.soft_cache.put(embedding, confidence)
+        return confidence * 0.3  # 最大0.3分
     
     def _consistency_check(self, node: Dict, page_state: Dict) -> float:
         """
@@ -185,61 +348,81 @@ class DualVerifier:
         Returns:
             分数 [0, 0.1]
         """
-        score = 0.0
-        node_type = node.get("type")
-        
-        if node_type == "EXTRACT":
-            extracted = page_state.get("extracted_data", {})
-            expected_fields = node.get("params", {}).get("fields", [])
-            if expected_fields:
-                completeness = len([f for f in expected_fields if f in extracted]) / len(expected_fields)
-                score = completeness * 0.1
-            elif extracted:
-                score = 0.1
-                
-        elif node_type == "COLLECT":
-            collected = page_state.get("collected_items", [])
-            if len(collected) > 0:
-                score = 0.1
-                
-        elif node_type == "COMPUTE":
-            if not page_state.get("compute_error"):
-                score = 0.1
-                
-        elif node_type == "NAVIGATE":
-            if page_state.get("navigation_success"):
-                score = 0.1
-                
-        return score
+        scorer = self._consistency_scorers.get(node.get("type"))
+        return scorer(node, page_state) if scorer is not None else 0.0
+    
+    @staticmethod
+    def _consistency_extract(node: Dict, page_state: Dict, expected_fields: frozenset = None) -> float:
+        """EXTRACT: 字段齐全率（expected_fields 可由调用方预先构造）"""
+        extracted = page_state.get("extracted_data", {})
+        if expected_fields is None:
+            expected_fields = frozenset(node.get("params", {}).get("fields", []))
+        if expected_fields:
+            extracted_keys = extracted.keys() if isinstance(extracted, dict) else set(extracted)
+            completeness = len(expected_fields & extracted_keys) / len(expected_fields)
+            return completeness * 0.1
+        return 0.1 if extracted else 0.0
+    
+    @staticmethod
+    def _consistency_collect(node: Dict, page_state: Dict) -> float:
+        """COLLECT: 收集数量 > 0"""
+        return 0.1 if len(page_state.get("collected_items", [])) > 0 else 0.0
+    
+    @staticmethod
+    def _consistency_compute(node: Dict, page_state: Dict) -> float:
+        """COMPUTE: 计算无异常"""
+        return 0.0 if page_state.get("compute_error") else 0.1
     
-    def _check_url_pattern(self, predicate: str, current_url: str) -> bool:
+    @staticmethod
+    def _consistency_navigate(node: Dict, page_state: Dict) -> float:
+        """NAVIGATE: 导航成功"""
+        return 0.1 if page_state.get("navigation_success") else 0.0
+    
+    def _check_url_pattern(self, node: Dict, page_state: Dict) -> bool:
         """检查URL模式"""
-        if not predicate or not current_url:
+        current_url = self._lowered(page_state, "url")
+        if not current_url:
             return False
             
-        # 提取URL相关的断言
-        url_patterns = re.findall(r'URL[包含|匹配|等于][\s]*["\']?([^"\']+)["\']?', predicate)
+        # URL相关的断言
+        url_patterns = self._predicate_patterns(node)[0]
         
         for pattern in url_patterns:
-            if pattern.lower() in current_url.lower():
+            if pattern in current_url:
                 return True
                 
         return False
     
-    def _check_title_match(self, predicate: str, page_title: str) -> bool:
+    def _check_title_match(self, node: Dict, page_state: Dict) -> bool:
         """检查页面标题"""
-        if not predicate or not page_title:
+        page_title = self._lowered(page_state, "title")
+        if not page_title:
             return False
             
-        # 提取标题相关的断言
-        title_patterns = re.findall(r'标题[包含|匹配|等于][\s]*["\']?([^"\']+)["\']?', predicate)
+        # 标题相关的断言
+        title_patterns = self._predicate_patterns(node)[1]
         
         for pattern in title_patterns:
-            if pattern.lower() in page_title.lower():
+            if pattern in page_title:
                 return True
                 
         return False
     
+    def _predicate_patterns(self, node: Dict) -> Tuple[list, list]:
+        """
+        获取节点谓词中的小写 (URL断言, 标题断言) 列表
+        
+        按节点ID缓存在验证器上（不写入任务图），谓词被修复改写后自动重新提取。
+        """
+        predicate = node.get("predicate") or ""
+        cached = self._pattern_cache.get(node.get("id"))
+        if cached is not None and cached[0] == predicate:
+            return cached[1], cached[2]
+        url_patterns = [m.lower() for m in _URL_RE.findall(predicate)]
+        title_patterns = [m.lower() for m in _TITLE_RE.findall(predicate)]
+        self._pattern_cache[node.get("id")] = (predicate, url_patterns, title_patterns)
+        return url_patterns, title_patterns
+    
     def _check_dom_elements(self, node: Dict, dom_elements: list) -> bool:
         """检查DOM元素"""
         required_elements = node.get("params", {}).get("required_elements", [])
@@ -253,25 +436,43 @@ class DualVerifier:
     def _simple_semantic_check(self, node: Dict, page_state: Dict) -> float:
         """简单语义检查（无LLM）"""
         goal = node.get("goal", "").lower()
-        content = page_state.get("text_content", "").lower()
-        
-        # 关键词匹配
-        keywords = goal.split()
-        matches = sum(1 for kw in keywords if kw in content)
         
+        # 关键词匹配（去重，避免重复扫描页面内容）
+        keywords = set(goal.split())
         if not keywords:
             return 0.0
             
+        content = self._lowered(page_state, "text_content")
+        matches = sum(1 for kw in keywords if kw in content)
+        
         confidence = matches / len(keywords)
         return confidence * 0.3
     
+    def _lowered(self, page_state: Dict, key: str) -> str:
+        """
+        获取page_state字段的小写形式
+        
+        每个字段最近一次的 (原值, 小写值) 缓存在验证器上（不写入page_state），
+        供同一页面的多次验证复用；原值被替换（如页面跳转）后自动重新计算。
+        """
+        value = page_state.get(key) or ""
+        cached = self._lowered_cache.get(key)
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        lowered = value.lower()
+        self._lowered_cache[key] = (value, lowered)
+        return lowered
+    
     def _parse_soft_check_response(self, response: str) -> float:
         """解析软验证响应"""
-        # 提取置信度
-        match = re.search(r'(\d+)', response)
-        if match:
-            confidence = int(match.group(1)) / 100.0
-            return min(confidence, 1.0)
+        # 提取第一个数字作为置信度（isdecimal与正则\d的匹配范围一致）
+        for i, c in enumerate(response):
+            if c.isdecimal():
+                j = i + 1
+                while j < len(response) and response[j].isdecimal():
+                    j += 1
+                confidence = int(response[i:j]) / 100.0
+                return min(confidence, 1.0)
         
         # 简单的是/否判断
         if "是" in response or "yes" in response.lower():
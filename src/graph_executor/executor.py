@@ -1,12 +1,22 @@
 """
 Graph Executor - 任务图执行器
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
+from types import CodeType
 from dataclasses import dataclass, field
 from enum import Enum
+import hashlib
+import logging
 import time
 
 
+# 节点执行进度经 "GraphWebAgent" 日志器输出，日志级别高于INFO时不再格式化消息
+logger = logging.getLogger("GraphWebAgent.executor")
+
+# 不操作页面的节点类型，执行后无需等待页面稳定
+_NON_DOM_NODE_TYPES = frozenset({"COMPUTE", "VERIFY", "BRANCH", "ITERATE"})
+
+
 class NodeStatus(Enum):
     """节点状态"""
     PENDING = "pending"
@@ -25,8 +35,10 @@ class ExecutionContext:
     node_results: Dict[str, Any] = field(default_factory=dict)
     page_state: Dict[str, Any] = field(default_factory=dict)
     step_count: int = 0
-    start_time: float = 0.0
+    start_time: float = 0.0  # time.monotonic()，仅用于计算耗时
     repair_count: Dict[str, int] = field(default_factory=dict)
+    node_map: Dict[str, Dict] = field(default_factory=dict)  # 节点ID -> 节点
+    dom_hash: Optional[str] = None  # 最近一次等待页面稳定得到的页面摘要（不写入page_state）
 
 
 class GraphExecutor:
@@ -52,6 +64,13 @@ class GraphExecutor:
         from local_repair.rollback import NoProgressDetector
         self.no_progress_detector = NoProgressDetector(window_size=3)
         
+        # 拓扑排序使用的验证器（各次执行共享）
+        from task_compiler.validator import GraphValidator
+        self.validator = GraphValidator()
+        
+        # 表达式编译缓存（BRANCH条件 / COMPUTE函数）：表达式 -> 代码对象或编译错误
+        self._expr_cache: Dict[str, Union[CodeType, Exception]] = {}
+        
     def execute(self, task_graph: Dict) -> Dict[str, Any]:
         """
         执行任务图
@@ -65,21 +84,21 @@ class GraphExecutor:
         # 初始化执行上下文
         context = ExecutionContext(
             task_graph=task_graph,
-            start_time=time.time()
+            start_time=time.monotonic()
         )
         
         # 获取拓扑排序
-        from task_compiler.validator import GraphValidator
-        validator = GraphValidator()
-        
         try:
-            topo_order = validator.get_topological_order(
+            topo_order = self.validator.get_topological_order(
                 task_graph["nodes"],
                 task_graph["edges"]
             )
         except Exception as e:
             return self._create_error_result(f"拓扑排序失败: {e}", context)
         
+        # 节点索引，执行期间按ID查找节点
+        context.node_map = {n["id"]: n for n in task_graph["nodes"]}
+        
         # 初始化节点状态
         for node_id in topo_order:
             context.node_states[node_id] = NodeStatus.PENDING
@@ -90,7 +109,7 @@ class GraphExecutor:
             if context.step_count >= self.max_steps:
                 return self._create_error_result("超过最大步数限制", context)
             
-            node = self._get_node_by_id(task_graph, node_id)
+            node = context.node_map.get(node_id)
             if not node:
                 continue
                 
@@ -119,94 +138,125 @@ class GraphExecutor:
         context.current_node = node_id
         context.node_states[node_id] = NodeStatus.RUNNING
         
-        print(f"执行节点 {node_id} ({node_type}): {node.get('goal', '')}")
+        logger.info("执行节点 %s (%s): %s", node_id, node_type, node.get("goal", ""))
         
         try:
             # 1. 执行动作
             self._perform_action(node, context)
             
             # 2. 等待页面稳定
-            self._wait_for_stability(context)
+            self._wait_for_stability(context, node)
             
             # 3. 收集证据
             self._collect_evidence(node, context)
             
             # 4. 双路验证（使用成本路由）
-            model_tier = None
-            if self.router:
-                model_tier = self.router.route(node, context.page_state, context.__dict__)
-                print(f"  路由决策: {model_tier.value}")
-            
+            # 路由是本地规则判断（无I/O），且其结果决定是否调用LLM，因此不与验证并行推测执行；
+            # 验证的LLM调用也不跨节点重叠：各节点共用同一页面，下一节点须等本节点验证结果
+            model_tier = self._route(node, context)
             verification = self.verifier.verify(node, context.page_state, model_tier)
             
-            # 记录LLM调用
-            if self.router and model_tier:
-                self.router.record_call(model_tier, node_id, input_tokens=100, output_tokens=50)
+            return self._apply_verification(node, context, verification, model_tier)
+                
+        except Exception as e:
+            return self._record_error(node_id, context, e)
+    
+    def _route(self, node: Dict, context: ExecutionContext):
+        """成本路由决策（未配置路由器时返回None）"""
+        if not self.router:
+            return None
+        model_tier = self.router.route(node, context.page_state, context.__dict__)
+        logger.info("路由决策: %s", model_tier.value)
+        return model_tier
+    
+    def _capture_browser_state(self) -> Dict[str, Any]:
+        """获取用于检查点的浏览器状态"""
+        if hasattr(self.browser, "get_storage_state"):
+            return self.browser.get_storage_state()
+        return {
+            "url": self.browser.get_url(),
+            "cookies": self.browser.get_cookies(),
+            "local_storage": self.browser.get_local_storage()
+        }
+    
+    def _record_error(self, node_id: str, context: ExecutionContext, error: Exception) -> bool:
+        """记录节点执行异常，返回False"""
+        logger.warning("执行失败: %s", error)
+        context.node_states[node_id] = NodeStatus.FAILED
+        context.node_results[node_id] = {
+            "status": "failed",
+            "error": str(error)
+        }
+        return False
+    
+    def _apply_verification(self, node: Dict, context: ExecutionContext, verification, model_tier) -> bool:
+        """
+        根据验证结果更新节点状态、保存检查点
+        
+        Returns:
+            是否成功
+        """
+        node_id = node["id"]
+        page_state = context.page_state
+        
+        # 记录LLM调用
+        if self.router and model_tier:
+            self.router.record_call(model_tier, node_id, input_tokens=100, output_tokens=50)
+        
+        logger.info("置信度: %.2f (通过: %s)", verification.confidence, verification.passed)
+        v_dict = verification.to_dict()
+        
+        # 检测无进展（不操作页面的节点不重新获取DOM摘要，context.dom_hash是之前节点留下的，
+        # 计入检测会使连续的此类节点被误判为无进展）
+        tracks_dom = node.get("type") not in _NON_DOM_NODE_TYPES
+        if tracks_dom:
+            self.no_progress_detector.record_dom_state(page_state, dom_hash=context.dom_hash)
+        if tracks_dom and self.no_progress_detector.detect_no_progress():
+            logger.warning("检测到无进展（DOM连续不变）")
+            context.node_states[node_id] = NodeStatus.FAILED
+            context.node_results[node_id] = {
+                "status": "failed",
+                "confidence": verification.confidence,
+                "verification": v_dict,
+                "reason": "无进展检测触发"
+            }
+            return False
+        
+        if verification.passed:
+            context.node_states[node_id] = NodeStatus.SUCCESS
+            context.node_results[node_id] = {
+                "status": "success",
+                "confidence": verification.confidence,
+                "verification": v_dict
+            }
             
-            print(f"  置信度: {verification.confidence:.2f} (通过: {verification.passed})")
+            # 保存检查点
+            if self.rollback_manager:
+                self.rollback_manager.save_checkpoint(
+                    node_id=node_id,
+                    step=context.step_count,
+                    page_state=page_state,
+                    browser_state=self._capture_browser_state()
+                )
             
-            # 检测无进展
-            self.no_progress_detector.record_dom_state(context.page_state)
-            if self.no_progress_detector.detect_no_progress():
-                print("  检测到无进展（DOM连续不变）")
-                context.node_states[node_id] = NodeStatus.FAILED
-                context.node_results[node_id] = {
-                    "status": "failed",
-                    "confidence": verification.confidence,
-                    "verification": verification.to_dict(),  # 转换为字典
-                    "reason": "无进展检测触发"
-                }
-                return False
+            # 记录成功
+            if self.router:
+                self.router.record_success(node_id)
             
-            if verification.passed:
-                context.node_states[node_id] = NodeStatus.SUCCESS
-                context.node_results[node_id] = {
-                    "status": "success",
-                    "confidence": verification.confidence,
-                    "verification": verification.to_dict()  # 转换为字典
-                }
-                
-                # 保存检查点
-                if self.rollback_manager:
-                    browser_state = {
-                        "url": self.browser.get_url(),
-                        "cookies": self.browser.get_cookies(),
-                        "local_storage": self.browser.get_local_storage()
-                    }
-                    self.rollback_manager.save_checkpoint(
-                        node_id=node_id,
-                        step=context.step_count,
-                        page_state=context.page_state.copy(),
-                        browser_state=browser_state
-                    )
-                
-                # 记录成功
-                if self.router:
-                    self.router.record_success(node_id)
-                
-                return True
-            else:
-                context.node_states[node_id] = NodeStatus.FAILED
-                context.node_results[node_id] = {
-                    "status": "failed",
-                    "confidence": verification.confidence,
-                    "verification": verification.to_dict(),  # 转换为字典
-                    "reason": "验证未通过"
-                }
-                
-                # 记录失败
-                if self.router:
-                    self.router.record_failure(node_id)
-                
-                return False
-                
-        except Exception as e:
-            print(f"  执行失败: {e}")
+            return True
+        else:
             context.node_states[node_id] = NodeStatus.FAILED
             context.node_results[node_id] = {
                 "status": "failed",
-                "error": str(e)
+                "confidence": verification.confidence,
+                "verification": v_dict,
+                "reason": "验证未通过"
             }
+            
+            # 记录失败
+            if self.router:
+                self.router.record_failure(node_id)
+            
             return False
     
     def _perform_action(self, node: Dict, context: ExecutionContext) -> None:
@@ -236,7 +286,7 @@ class GraphExecutor:
             compute_fn = params.get("function")
             if compute_fn:
                 try:
-                    result = eval(compute_fn)  # 注意：实际应用中需要安全的执行方式
+                    result = eval(self._compile_expr(compute_fn))  # 注意：实际应用中需要安全的执行方式
                     context.page_state["compute_result"] = result
                 except Exception as e:
                     context.page_state["compute_error"] = str(e)
@@ -264,13 +314,14 @@ class GraphExecutor:
             max_iterations = params.get("max_iterations", 10)
             collection = context.page_state.get("collected_items", [])
             
-            print(f"  迭代处理 {len(collection)} 个项目（最多{max_iterations}次）")
+            logger.info("迭代处理 %d 个项目（最多%s次）", len(collection), max_iterations)
             
-            iteration_results = []
-            for i, item in enumerate(collection[:max_iterations]):
-                context.page_state["current_item"] = item
-                context.page_state["iteration_index"] = i
-                iteration_results.append(item)
+            # 逐项展开只会依次覆盖current_item/iteration_index，结果列表即前max_iterations项，
+            # 因此只切片一次并直接记录最后一项
+            iteration_results = collection[:max_iterations]
+            if iteration_results:
+                context.page_state["current_item"] = iteration_results[-1]
+                context.page_state["iteration_index"] = len(iteration_results) - 1
             
             context.page_state["iteration_results"] = iteration_results
             context.page_state["state_changed"] = True
@@ -285,31 +336,31 @@ class GraphExecutor:
                 condition_result = self._evaluate_condition(condition, context.page_state)
                 context.page_state["branch_taken"] = condition_result
                 context.page_state["state_changed"] = True
-                print(f"  分支条件 '{condition}' 结果: {condition_result}")
+                logger.info("分支条件 '%s' 结果: %s", condition, condition_result)
             except Exception as e:
-                print(f"  分支条件评估失败: {e}")
+                logger.warning("分支条件评估失败: %s", e)
                 context.page_state["branch_taken"] = False
     
-    def _wait_for_stability(self, context: ExecutionContext) -> None:
+    def _wait_for_stability(self, context: ExecutionContext, node: Optional[Dict] = None) -> None:
         """
         等待页面稳定 - WAIT_UNTIL机制
-        连续N次DOM摘要一致才认为页面稳定
+        连续N次DOM摘要一致才认为页面稳定；不操作页面的节点类型直接跳过
         """
-        import hashlib
-        import time
-        
+        if node is not None and node.get("type") in _NON_DOM_NODE_TYPES:
+            return
+            
         max_attempts = 5
         stable_count = 0
         required_stable_count = 3
-        timeout = self.config.get("wait_timeout", 10000)
-        start_time = time.time() * 1000
+        timeout_ns = self.config.get("wait_timeout", 10000) * 1_000_000
+        start_ns = time.monotonic_ns()
         
         last_dom_hash = None
         
         while stable_count < required_stable_count:
             # 检查超时
-            if (time.time() * 1000 - start_time) > timeout:
-                print("  等待页面稳定超时")
+            if time.monotonic_ns() - start_ns > timeout_ns:
+                logger.warning("等待页面稳定超时")
                 break
             
             # 等待一小段时间
@@ -317,8 +368,7 @@ class GraphExecutor:
             
             # 获取当前DOM摘要
             try:
-                text_content = self.browser.get_text_content()
-                dom_hash = hashlib.md5(text_content.encode()).hexdigest()
+                dom_hash = self._get_dom_hash()
                 
                 if dom_hash == last_dom_hash:
                     stable_count += 1
@@ -327,28 +377,33 @@ class GraphExecutor:
                     last_dom_hash = dom_hash
                     
             except Exception as e:
-                print(f"  获取DOM摘要失败: {e}")
+                logger.warning("获取DOM摘要失败: %s", e)
                 break
         
         if stable_count >= required_stable_count:
-            print(f"  页面已稳定（连续{stable_count}次DOM一致）")
+            logger.info("页面已稳定（连续%d次DOM一致）", stable_count)
+            
+        # 供无进展检测直接复用，无需再次获取页面内容求摘要
+        context.dom_hash = last_dom_hash
+    
+    def _get_dom_hash(self) -> str:
+        """获取页面摘要（由BrowserEnvironment.get_dom_hash计算；未继承该基类的浏览器对象回退到文本MD5）"""
+        if hasattr(self.browser, "get_dom_hash"):
+            return self.browser.get_dom_hash()
+        return hashlib.md5(self.browser.get_text_content().encode()).hexdigest()
     
     def _collect_evidence(self, node: Dict, context: ExecutionContext) -> None:
         """收集证据"""
-        # 更新页面状态
-        context.page_state.update({
-            "url": self.browser.get_url(),
-            "title": self.browser.get_title(),
-            "text_content": self.browser.get_text_content(),
-            "dom_elements": context.page_state.get("dom_elements", [])
-        })
-    
-    def _get_node_by_id(self, task_graph: Dict, node_id: str) -> Optional[Dict]:
-        """根据ID获取节点"""
-        for node in task_graph.get("nodes", []):
-            if node["id"] == node_id:
-                return node
-        return None
+        # 更新页面状态（浏览器支持时一次往返取回URL、标题与文本）
+        if hasattr(self.browser, "snapshot"):
+            context.page_state.update(self.browser.snapshot())
+        else:
+            context.page_state.update({
+                "url": self.browser.get_url(),
+                "title": self.browser.get_title(),
+                "text_content": self.browser.get_text_content()
+            })
+        context.page_state.setdefault("dom_elements", [])
     
     def _create_success_result(self, context: ExecutionContext) -> Dict:
         """创建成功结果"""
@@ -356,7 +411,7 @@ class GraphExecutor:
             "success": True,
             "task_id": context.task_graph.get("task_id"),
             "steps": context.step_count,
-            "duration": time.time() - context.start_time,
+            "duration": time.monotonic() - context.start_time,
             "node_results": context.node_results,
             "final_state": context.page_state
         }
@@ -368,7 +423,7 @@ class GraphExecutor:
             "task_id": context.task_graph.get("task_id"),
             "failed_node": failed_node["id"],
             "steps": context.step_count,
-            "duration": time.time() - context.start_time,
+            "duration": time.monotonic() - context.start_time,
             "node_results": context.node_results,
             "error": context.node_results.get(failed_node["id"], {}).get("reason", "未知错误")
         }
@@ -380,7 +435,7 @@ class GraphExecutor:
             "task_id": context.task_graph.get("task_id", "unknown"),
             "error": error_msg,
             "steps": context.step_count,
-            "duration": time.time() - context.start_time
+            "duration": time.monotonic() - context.start_time
         }
     
     def _evaluate_condition(self, condition: str, page_state: Dict) -> bool:
@@ -407,10 +462,25 @@ class GraphExecutor:
             }
             
             # 评估条件
-            result = eval(condition, {"__builtins__": {}}, safe_locals)
+            result = eval(self._compile_expr(condition), {"__builtins__": {}}, safe_locals)
             return bool(result)
         except Exception as e:
-            print(f"条件评估错误: {e}")
+            logger.warning("条件评估错误: %s", e)
             return False
-
-
+    
+    def _compile_expr(self, expression: str) -> CodeType:
+        """
+        编译表达式并缓存代码对象，同一表达式只解析一次
+        
+        无法解析的表达式缓存其编译错误，之后直接抛出该错误而不再重复解析。
+        """
+        code = self._expr_cache.get(expression)
+        if code is None:
+            try:
+                code = compile(expression, "<expr>", "eval")
+            except (SyntaxError, ValueError) as e:
+                code = e
+            self._expr_cache[expression] = code
+        if isinstance(code, Exception):
+            raise code.with_traceback(None)
+        return code
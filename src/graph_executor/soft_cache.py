@@ -0,0 +1,275 @@
+"""
+Soft Check Cache - 软验证语义缓存
+"""
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy为可选依赖
+    np = None
+
+
+class SemanticCache:
+    """
+    语义缓存（LRU）
+    
+    以文本嵌入为键，查询时与已缓存嵌入计算余弦相似度，
+    最高相似度不低于阈值即视为命中。
+    
+    所有嵌入以归一化行的形式保存在一个连续的float32矩阵中，查询是一次矩阵-向量乘法；
+    写入直接填充空闲行（淘汰条目留下的行会被复用），无需重建矩阵。
+    quantize=True 时改为int8存储（每个分量乘以127取整），常驻内存降为1/4，
+    相似度以int32累加后换算回余弦值，误差约1e-2量级。
+    """
+    
+    # int8量化比例
+    _QSCALE = 127
+    
+    def __init__(self, threshold: float = 0.87, max_size: int = 1024, quantize: bool = False):
+        """
+        Args:
+            threshold: 命中所需的最小余弦相似度
+            max_size: 最大缓存条目数
+            quantize: 是否以int8量化存储嵌入
+        """
+        if np is None:
+            raise ImportError("SemanticCache 需要 numpy: pip install numpy")
+            
+        self.threshold = threshold
+        self.max_size = max_size
+        self.quantize = quantize
+        
+        # 条目ID -> (矩阵行号, 缓存值)，按最近使用排序
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        
+        # 嵌入矩阵 (容量, 维度)，首次写入时按维度分配，容量倍增至max_size
+        self._matrix = None
+        self._row_ids: list = []  # 行号 -> 条目ID（空闲行为None）
+        self._free_rows: list = []  # 淘汰后可复用的行
+        self._used_rows = 0  # 已使用过的行数，查询只扫描这部分
+        
+        self.hits = 0
+        self.misses = 0
+        
+    def get(self, embedding) -> Optional[Any]:
+        """查找语义相近的缓存值，未命中返回None"""
+        entry_id = self._lookup(self._normalize(embedding))
+        if entry_id is None:
+            self.misses += 1
+            return None
+            
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        self._on_hit(entry_id)
+        return self._entries[entry_id][1]
+        
+    def put(self, embedding, value: Any) -> None:
+        """写入缓存"""
+        self._insert(self._normalize(embedding), value)
+        
+    def _lookup(self, query) -> Optional[int]:
+        """返回与query相似度最高且不低于阈值的条目ID"""
+        if not self._entries:
+            return None
+            
+        # 空闲行为零向量，相似度为0，不会超过（正的）阈值
+        matrix = self._matrix[:self._used_rows]
+        if self.quantize:
+            # int8乘积以int32累加，避免溢出
+            sims = np.matmul(matrix, self._quantize_vec(query), dtype=np.int32) * (1.0 / self._QSCALE ** 2)
+        else:
+            sims = matrix @ query
+        best = int(sims.argmax())
+        if sims[best] >= self.threshold:
+            return self._row_ids[best]
+        return None
+        
+    def _insert(self, vec, value: Any) -> int:
+        """插入已归一化的嵌入，返回条目ID"""
+        # 先淘汰最久未使用的条目，腾出的行直接复用
+        while len(self._entries) >= self.max_size:
+            evicted_id = next(iter(self._entries))
+            self._remove(evicted_id)
+            
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self._used_rows
+            self._used_rows += 1
+            self._ensure_capacity(row + 1, vec.shape[0])
+            
+        entry_id = self._next_id
+        self._next_id += 1
+        self._matrix[row] = self._quantize_vec(vec) if self.quantize else vec
+        self._row_ids[row] = entry_id
+        self._entries[entry_id] = (row, value)
+        return entry_id
+        
+    def _remove(self, entry_id: int) -> None:
+        """删除条目并释放其矩阵行"""
+        row, _ = self._entries.pop(entry_id)
+        self._matrix[row] = 0.0
+        self._row_ids[row] = None
+        self._free_rows.append(row)
+        self._on_evict(entry_id)
+        
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        """保证矩阵至少有rows行（按倍增扩容，不超过max_size）"""
+        if self._matrix is not None and self._matrix.shape[0] >= rows:
+            return
+            
+        capacity = 64 if self._matrix is None else self._matrix.shape[0] * 2
+        capacity = min(max(capacity, rows), self.max_size)
+        matrix = np.zeros((capacity, dim), dtype=np.int8 if self.quantize else np.float32)
+        if self._matrix is not None:
+            matrix[:self._matrix.shape[0]] = self._matrix
+        self._matrix = matrix
+        self._row_ids.extend([None] * (capacity - len(self._row_ids)))
+        
+    def _on_hit(self, entry_id: int) -> None:
+        """命中回调（子类扩展）"""
+        
+    def _on_evict(self, entry_id: int) -> None:
+        """淘汰回调（子类扩展）"""
+        
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._matrix = None
+        self._row_ids = []
+        self._free_rows = []
+        self._used_rows = 0
+        
+    @property
+    def hit_rate(self) -> float:
+        """命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+        
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate
+        }
+        
+    @classmethod
+    def _quantize_vec(cls, vec):
+        """将单位向量量化为int8"""
+        return np.clip(np.round(vec * cls._QSCALE), -cls._QSCALE, cls._QSCALE).astype(np.int8)
+        
+    @staticmethod
+    def _normalize(embedding):
+        """转换为单位向量"""
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+
+class PersistentSemanticCache(SemanticCache):
+    """
+    持久化语义缓存（SQLite）
+    
+    条目同时写入SQLite文件，启动时载入内存嵌入矩阵，重复实验时复用之前的软验证结果。
+    载入时优先保留命中次数多的条目；超过ttl秒的条目视为过期。
+    """
+    
+    def __init__(self, path, ttl: Optional[float] = None, threshold: float = 0.87,
+                 max_size: int = 1024, namespace: str = "", quantize: bool = False):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            ttl: 条目有效期（秒），None表示永不过期
+            threshold: 命中所需的最小余弦相似度
+            max_size: 内存中最大缓存条目数
+            namespace: 键前缀（如模型名），不同模型/嵌入器的条目互不混用
+            quantize: 是否以int8量化存储内存中的嵌入（数据库中始终保存float32）
+        """
+        super().__init__(threshold=threshold, max_size=max_size, quantize=quantize)
+        
+        self.path = Path(path)
+        self.ttl = ttl
+        self.namespace = namespace
+        
+        # 条目ID -> (数据库键, 写入时间)
+        self._meta: Dict[int, tuple] = {}
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS soft_cache ("
+            "key TEXT PRIMARY KEY, embedding BLOB, response TEXT, hits INTEGER DEFAULT 0, ts REAL)"
+        )
+        self._load()
+        
+    def put(self, embedding, value: Any) -> None:
+        """写入缓存并持久化"""
+        vec = self._normalize(embedding)
+        key = f"{self.namespace}:{hashlib.sha1(vec.tobytes()).hexdigest()}"
+        now = time.time()
+        
+        self._conn.execute(
+            "INSERT OR REPLACE INTO soft_cache (key, embedding, response, hits, ts) VALUES (?, ?, ?, 0, ?)",
+            (key, vec.tobytes(), json.dumps(value), now)
+        )
+        self._conn.commit()
+        
+        entry_id = self._insert(vec, value)
+        self._meta[entry_id] = (key, now)
+        
+    def clear(self) -> None:
+        """清空缓存（包括本命名空间下的持久化条目）"""
+        super().clear()
+        self._meta.clear()
+        self._conn.execute("DELETE FROM soft_cache WHERE key LIKE ?", (f"{self.namespace}:%",))
+        self._conn.commit()
+        
+    def close(self) -> None:
+        """提交未写入的命中计数并关闭数据库"""
+        self._conn.commit()
+        self._conn.close()
+        
+    def _lookup(self, query) -> Optional[int]:
+        """在父类查找基础上剔除过期条目"""
+        entry_id = super()._lookup(query)
+        if entry_id is not None and self.ttl is not None:
+            key, ts = self._meta[entry_id]
+            if time.time() - ts > self.ttl:
+                self._remove(entry_id)
+                self._conn.execute("DELETE FROM soft_cache WHERE key = ?", (key,))
+                return None
+        return entry_id
+        
+    def _on_hit(self, entry_id: int) -> None:
+        """累计命中次数（随下一次写入或close时提交）"""
+        self._conn.execute("UPDATE soft_cache SET hits = hits + 1 WHERE key = ?", (self._meta[entry_id][0],))
+        
+    def _on_evict(self, entry_id: int) -> None:
+        """淘汰时移除元数据（数据库中的条目保留，供下次启动载入）"""
+        self._meta.pop(entry_id, None)
+        
+    def _load(self) -> None:
+        """从数据库载入条目：先删除过期条目，再按命中次数、写入时间保留前max_size条"""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM soft_cache WHERE ts < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+            
+        rows = self._conn.execute(
+            "SELECT key, embedding, response, ts FROM soft_cache WHERE key LIKE ? "
+            "ORDER BY hits DESC, ts DESC LIMIT ?",
+            (f"{self.namespace}:%", self.max_size)
+        ).fetchall()
+        
+        # 逆序插入，使高频条目位于LRU末端、最后被淘汰
+        for key, blob, response, ts in reversed(rows):
+            entry_id = self._insert(np.frombuffer(blob, dtype=np.float32), json.loads(response))
+            self._meta[entry_id] = (key, ts)
@@ -4,6 +4,51 @@ Local Repair Engine - 局部修复引擎
 from typing import Dict, List, Any, Optional, Tuple
 from enum import Enum
 from dataclasses import dataclass
+from array import array
+import logging
+import re
+
+
+logger = logging.getLogger("GraphWebAgent.repair")
+
+# 弹窗关闭按钮 / 翻页按钮的候选选择器，合并为一个CSS并集，一次点击调用即可命中任一候选
+_CLOSE_POPUP_SELECTOR = ", ".join([
+    "button.close",
+    ".modal-close",
+    "[aria-label='Close']",
+    ".popup-close"
+])
+_NEXT_PAGE_SELECTOR = ", ".join([
+    "a.next",
+    "button.next",
+    "[aria-label='Next']",
+    ".pagination-next"
+])
+
+# 弹窗相关关键词
+_MODAL_RE = re.compile(r"modal|popup|dialog|overlay", re.IGNORECASE)
+# 判断元素是否为弹窗时检查的属性
+_POPUP_ATTRS = ("class", "id", "role", "aria-label", "tag")
+
+
+def _build_csr(num_nodes: int, edges: List[Tuple[int, int]]) -> Tuple[array, array]:
+    """
+    按起点排序边集，构建CSR邻接表（indptr/indices均为int32连续数组）
+    
+    节点i的邻居为 indices[indptr[i]:indptr[i + 1]]。
+    """
+    indptr = array("i", [0]) * (num_nodes + 1)
+    for u, _ in edges:
+        indptr[u + 1] += 1
+    for i in range(num_nodes):
+        indptr[i + 1] += indptr[i]
+        
+    indices = array("i", [0]) * len(edges)
+    cursor = array("i", indptr[:-1])
+    for u, v in edges:
+        indices[cursor[u]] = v
+        cursor[u] += 1
+    return indptr, indices
 
 
 class FailureType(Enum):
@@ -35,6 +80,14 @@ class LocalRepairEngine:
         # 修复策略表
         self.repair_strategies = self._init_repair_strategies()
         
+        # 计算拓扑序使用的验证器（各次修复共享）
+        from task_compiler.validator import GraphValidator
+        self.validator = GraphValidator()
+        
+        # 最近一次构建的图索引及其对应的 (任务图, 节点列表, 边列表, 节点数, 边数)，见 _graph_index
+        self._index_key: Optional[Tuple] = None
+        self._index: Optional[Dict[str, Any]] = None
+        
     def _init_repair_strategies(self) -> Dict[FailureType, List[RepairStrategy]]:
         """初始化修复策略表"""
         return {
@@ -120,7 +173,8 @@ class LocalRepairEngine:
             error = verification_result.get("details", {}).get("error", "")
         
         # 基于节点类型和错误信息分类
-        if "element" in error.lower() or "selector" in error.lower():
+        error_lower = error.lower()
+        if "element" in error_lower or "selector" in error_lower:
             return FailureType.GROUNDING_FAIL
             
         if node_type == "EXTRACT":
@@ -195,21 +249,20 @@ class LocalRepairEngine:
         ancestors = self._find_ancestors(task_graph, failed_node_id, rollback_depth)
         
         # 构建需要重新执行的子图
-        subgraph_nodes = ancestors + [failed_node_id]
+        subgraph_nodes = set(ancestors)
+        subgraph_nodes.add(failed_node_id)
         
         # 添加失败节点的所有后继节点
         descendants = self._find_descendants(task_graph, failed_node_id)
-        subgraph_nodes.extend(descendants)
+        subgraph_nodes.update(descendants)
         
-        # 去重并保持拓扑顺序
-        from task_compiler.validator import GraphValidator
-        validator = GraphValidator()
-        topo_order = validator.get_topological_order(
-            task_graph["nodes"],
-            task_graph["edges"]
-        )
+        # 去重并保持拓扑顺序：按缓存的全图拓扑位置排序，只处理子图节点
+        topo_position = self._graph_index(task_graph)["topo_position"]
         
-        ordered_subgraph = [nid for nid in topo_order if nid in subgraph_nodes]
+        ordered_subgraph = sorted(
+            (nid for nid in subgraph_nodes if nid in topo_position),
+            key=topo_position.__getitem__
+        )
         
         return ordered_subgraph, rollback_depth
     
@@ -234,12 +287,12 @@ class LocalRepairEngine:
         Returns:
             是否修复成功
         """
-        print(f"应用修复策略: {strategy.strategy_name}")
+        logger.info("应用修复策略: %s", strategy.strategy_name)
         
         # 检查幂等性
         is_idempotent = node.get("idempotent", True)
         if check_idempotent and not is_idempotent:
-            print(f"  警告: 节点{node.get('id')}非幂等，修复可能需要环境重置")
+            logger.warning("节点%s非幂等，修复可能需要环境重置", node.get("id"))
             # 非幂等节点修复前应该回滚或重置环境
             # 这里简化处理，实际应该由调用者处理
         
@@ -249,7 +302,7 @@ class LocalRepairEngine:
                 if success:
                     return True
             except Exception as e:
-                print(f"  修复动作失败 {action}: {e}")
+                logger.warning("修复动作失败 %s: %s", action, e)
                 continue
                 
         return False
@@ -295,65 +348,114 @@ class LocalRepairEngine:
         if depth == 0:
             return []
             
-        edges = task_graph.get("edges", [])
-        
-        # 构建反向图
-        reverse_graph = {}
-        for from_node, to_node in edges:
-            if to_node not in reverse_graph:
-                reverse_graph[to_node] = []
-            reverse_graph[to_node].append(from_node)
-        
-        # BFS向上查找
+        index = self._graph_index(task_graph)
+        start = index["id_to_idx"].get(node_id)
+        if start is None:
+            return []
+            
+        # 在反向CSR上逐层BFS，每个祖先只在首次到达时记录
+        indptr, indices = index["pred_indptr"], index["pred_indices"]
+        visited = bytearray(len(index["idx_to_id"]))
         ancestors = []
-        current_level = [node_id]
+        current_level = [start]
         
         for _ in range(depth):
             next_level = []
             for node in current_level:
-                parents = reverse_graph.get(node, [])
-                next_level.extend(parents)
-                ancestors.extend(parents)
+                for k in range(indptr[node], indptr[node + 1]):
+                    parent = indices[k]
+                    if not visited[parent]:
+                        visited[parent] = 1
+                        next_level.append(parent)
+            ancestors.extend(next_level)
             current_level = next_level
             
-        return list(set(ancestors))
+        idx_to_id = index["idx_to_id"]
+        return [idx_to_id[i] for i in ancestors]
     
     def _find_descendants(self, task_graph: Dict, node_id: str) -> List[str]:
         """找到节点的所有后继节点"""
-        edges = task_graph.get("edges", [])
-        
-        # 构建邻接表
-        graph = {}
-        for from_node, to_node in edges:
-            if from_node not in graph:
-                graph[from_node] = []
-            graph[from_node].append(to_node)
-        
-        # DFS查找所有后继
+        index = self._graph_index(task_graph)
+        start = index["id_to_idx"].get(node_id)
+        if start is None:
+            return []
+            
+        # 在CSR邻接表上用显式栈遍历（无递归深度限制）
+        indptr, indices = index["succ_indptr"], index["succ_indices"]
+        visited = bytearray(len(index["idx_to_id"]))
+        visited[start] = 1
         descendants = []
-        visited = set()
+        stack = [start]
+        
+        while stack:
+            node = stack.pop()
+            # 按下标访问CSR区间，避免每个节点切片复制一次数组
+            for k in range(indptr[node], indptr[node + 1]):
+                child = indices[k]
+                if not visited[child]:
+                    visited[child] = 1
+                    descendants.append(child)
+                    stack.append(child)
+                    
+        idx_to_id = index["idx_to_id"]
+        return [idx_to_id[i] for i in descendants]
+    
+    def _graph_index(self, task_graph: Dict) -> Dict[str, Any]:
+        """
+        获取任务图的CSR邻接表、反向CSR邻接表、拓扑序及各节点的拓扑位置
         
-        def dfs(node):
-            if node in visited:
-                return
-            visited.add(node)
+        索引缓存在修复引擎上（array不可JSON序列化，不写入任务图），
+        同一任务图的多次修复尝试直接复用；任务图、节点列表或边列表被替换，
+        或节点/边数量变化（如 _fix_topology 移除成环的边）时重新构建。
+        节点ID映射为连续整数下标，遍历只访问int32数组与bytearray标记。
+        """
+        nodes = task_graph["nodes"]
+        edges_list = task_graph.get("edges", [])
+        key = self._index_key
+        if (key is not None and key[0] is task_graph and key[1] is nodes and key[2] is edges_list
+                and key[3] == len(nodes) and key[4] == len(edges_list)):
+            return self._index
             
-            for child in graph.get(node, []):
-                descendants.append(child)
-                dfs(child)
+        idx_to_id = [node["id"] for node in nodes]
+        id_to_idx = {node_id: i for i, node_id in enumerate(idx_to_id)}
+        # 边中出现但未声明的节点同样分配下标
+        for edge in edges_list:
+            for node_id in edge:
+                if node_id not in id_to_idx:
+                    id_to_idx[node_id] = len(idx_to_id)
+                    idx_to_id.append(node_id)
+                    
+        edges = [(id_to_idx[u], id_to_idx[v]) for u, v in edges_list]
+        succ_indptr, succ_indices = _build_csr(len(idx_to_id), edges)
+        pred_indptr, pred_indices = _build_csr(len(idx_to_id), [(v, u) for u, v in edges])
         
-        dfs(node_id)
-        return descendants
+        topo_order = self.validator.get_topological_order(nodes, edges_list)
+        
+        index = {
+            "idx_to_id": idx_to_id,
+            "id_to_idx": id_to_idx,
+            "succ_indptr": succ_indptr,
+            "succ_indices": succ_indices,
+            "pred_indptr": pred_indptr,
+            "pred_indices": pred_indices,
+            "topo_order": topo_order,
+            "topo_position": {node_id: i for i, node_id in enumerate(topo_order)}
+        }
+        self._index_key = (task_graph, nodes, edges_list, len(nodes), len(edges_list))
+        self._index = index
+        return index
     
     def _detect_popup(self, page_state: Dict) -> bool:
         """检测是否有弹窗"""
         # 简化实现：检查DOM中是否有modal相关元素
         dom_elements = page_state.get("dom_elements", [])
-        modal_keywords = ["modal", "popup", "dialog", "overlay"]
         
         for element in dom_elements:
-            element_str = str(element).lower()
-            if any(kw in element_str for kw in modal_keywords):
+            if isinstance(element, dict):
+                # 字典形式的元素只检查少数标识属性，避免对整个字典求repr
+                if any(_MODAL_RE.search(str(element.get(key) or "")) for key in _POPUP_ATTRS):
+                    return True
+            elif _MODAL_RE.search(str(element)):
                 return True
                 
         return False
@@ -362,17 +464,9 @@ class LocalRepairEngine:
         """关闭弹窗"""
         try:
             # 尝试常见的关闭按钮选择器
-            close_selectors = [
-                "button.close",
-                ".modal-close",
-                "[aria-label='Close']",
-                ".popup-close"
-            ]
+            if browser_env.click(_CLOSE_POPUP_SELECTOR, timeout=1000):
+                return True
             
-            for selector in close_selectors:
-                if browser_env.click(selector, timeout=1000):
-                    return True
-                    
             # 尝试按ESC键
             browser_env.press_key("Escape")
             return True
@@ -392,17 +486,9 @@ class LocalRepairEngine:
     def _try_pagination(self, browser_env) -> bool:
         """尝试翻页"""
         try:
-            next_selectors = [
-                "a.next",
-                "button.next",
-                "[aria-label='Next']",
-                ".pagination-next"
-            ]
+            if browser_env.click(_NEXT_PAGE_SELECTOR, timeout=1000):
+                return True
             
-            for selector in next_selectors:
-                if browser_env.click(selector, timeout=1000):
-                    return True
-                    
         except Exception:
             pass
             
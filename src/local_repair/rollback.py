@@ -3,25 +3,159 @@ Rollback Manager - 回滚管理器
 """
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import copy
+import hashlib
+import pickle
 
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - 未安装时回退到hashlib
+    xxhash = None
 
-@dataclass
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时逐个元素取repr
+    orjson = None
+
+
+class StateSnapshot:
+    """
+    状态快照（结构共享）
+    
+    只保存相对父快照发生变化的键（深拷贝）与被删除的键，未变化的大字段
+    （text_content、dom_elements、cookies等）在相邻检查点之间共享同一份拷贝。
+    """
+    
+    __slots__ = ("parent", "delta", "removed")
+    
+    def __init__(self, parent: Optional["StateSnapshot"], delta: Dict, removed: frozenset = frozenset()):
+        self.parent = parent
+        self.delta = delta
+        self.removed = removed
+        
+    def flatten(self) -> Dict:
+        """合并快照链为字典（值与快照共享，调用方不得修改）"""
+        chain = []
+        snapshot = self
+        while snapshot is not None:
+            chain.append(snapshot)
+            snapshot = snapshot.parent
+            
+        state: Dict = {}
+        for snapshot in reversed(chain):
+            for key in snapshot.removed:
+                state.pop(key, None)
+            state.update(snapshot.delta)
+        return state
+    
+    def rebase(self) -> None:
+        """展开为完整快照并断开父快照（父检查点被淘汰时调用）"""
+        self.delta = self.flatten()
+        self.removed = frozenset()
+        self.parent = None
+    
+    @classmethod
+    def capture(cls, state: Dict, parent: Optional["StateSnapshot"] = None,
+                copy_policy: str = "deep") -> "StateSnapshot":
+        """
+        基于父快照记录state的增量（未变化时返回父快照本身）
+        
+        copy_policy: "deep" 深拷贝发生变化的值；"shallow" 只复制字典本身，值按引用保存；
+        "none" 不做任何复制（首个快照直接引用state）
+        """
+        copy_fn = _COPY_POLICIES[copy_policy]
+        if parent is None:
+            return cls(None, copy_fn(state))
+            
+        previous = parent.flatten()
+        changed = {
+            key: value
+            for key, value in state.items()
+            if key not in previous or not _same_value(previous[key], value)
+        }
+        removed = frozenset(key for key in previous if key not in state)
+        if not changed and not removed:
+            # 状态未变化（如只读步骤）：直接复用父快照，不再新增快照层
+            return parent
+        # changed本身已是新字典，shallow/none 只需按引用保存其中的值
+        return cls(parent, _fast_copy(changed) if changed and copy_policy == "deep" else changed, removed)
+
+
+def _fast_copy(obj: Any) -> Any:
+    """
+    深拷贝：优先使用pickle协议5往返（比copy.deepcopy的Python级遍历快数倍），
+    含不可序列化对象（如ElementHandle）时回退到deepcopy
+    """
+    try:
+        return pickle.loads(pickle.dumps(obj, protocol=5))
+    except Exception:
+        return copy.deepcopy(obj)
+
+
+# 检查点复制策略 -> 首个快照的复制方式
+_COPY_POLICIES = {
+    "deep": _fast_copy,
+    "shallow": dict,
+    "none": lambda state: state
+}
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    """判断快照中的值与当前值是否相同（无法比较时视为不同）"""
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+@dataclass(slots=True)
 class Checkpoint:
     """检查点"""
     node_id: str
     step: int
-    page_state: Dict
-    browser_state: Dict
+    snapshot: Optional[StateSnapshot]
+    browser_snapshot: Optional[StateSnapshot]
     timestamp: float
+    pending: Optional[Future] = field(default=None, repr=False)  # 后台复制尚未完成时的任务
+    
+    def resolve(self) -> "Checkpoint":
+        """等待后台复制完成（未使用后台复制时立即返回）"""
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+        return self
+    
+    @property
+    def page_state(self) -> Dict:
+        """还原该检查点的页面状态（返回独立副本）"""
+        return _fast_copy(self.resolve().snapshot.flatten())
+    
+    @property
+    def browser_state(self) -> Dict:
+        """还原该检查点的浏览器状态（返回独立副本）"""
+        return _fast_copy(self.resolve().browser_snapshot.flatten())
 
 
 class RollbackManager:
     """回滚管理器"""
     
-    def __init__(self, max_checkpoints: int = 10):
+    def __init__(self, max_checkpoints: int = 10, background_copy: bool = False):
+        """
+        Args:
+            max_checkpoints: 最多保留的检查点数
+            background_copy: 是否在后台线程中复制状态。开启后save_checkpoint只在主线程复制
+                顶层字典即返回，深拷贝与增量计算与后续的浏览器操作/LLM调用重叠；
+                要求调用方不原地修改已保存的值（执行器只整体替换page_state中的键）
+        """
         self.max_checkpoints = max_checkpoints
-        self.checkpoints: List[Checkpoint] = []
+        # 单个工作线程保证各检查点按保存顺序构建（增量依赖上一个检查点）
+        self._copy_executor = ThreadPoolExecutor(max_workers=1) if background_copy else None
+        # 有界环形缓冲区，超出max_checkpoints时自动淘汰最早的检查点
+        self.checkpoints: "deque[Checkpoint]" = deque(maxlen=max_checkpoints)
         self.rollback_history: List[Dict] = []
         
     def save_checkpoint(
@@ -29,7 +163,8 @@ class RollbackManager:
         node_id: str,
         step: int,
         page_state: Dict,
-        browser_state: Dict
+        browser_state: Dict,
+        copy_policy: str = "deep"
     ) -> None:
         """
         保存检查点
@@ -39,22 +174,56 @@ class RollbackManager:
             step: 步骤数
             page_state: 页面状态
             browser_state: 浏览器状态
+            copy_policy: 复制策略。"deep"（默认）深拷贝发生变化的值，调用方之后可随意修改状态；
+                "shallow"/"none" 按引用保存值，要求调用方此后不再原地修改已保存的值
+                （只整体替换键），"none" 连首个快照的字典也不复制
         """
         import time
         
+        if copy_policy not in _COPY_POLICIES:
+            raise ValueError(f"未知的复制策略: {copy_policy}")
+            
+        latest = self.checkpoints[-1] if self.checkpoints else None
         checkpoint = Checkpoint(
             node_id=node_id,
             step=step,
-            page_state=copy.deepcopy(page_state),
-            browser_state=copy.deepcopy(browser_state),
+            snapshot=None,
+            browser_snapshot=None,
             timestamp=time.time()
         )
         
+        evicting = len(self.checkpoints) == self.max_checkpoints
         self.checkpoints.append(checkpoint)
+        oldest = self.checkpoints[0] if evicting else None
+        
+        if self._copy_executor is None:
+            self._build_checkpoint(checkpoint, page_state, browser_state, latest, oldest, copy_policy)
+        else:
+            # 主线程只冻结顶层键，其余工作交给后台线程
+            checkpoint.pending = self._copy_executor.submit(
+                self._build_checkpoint, checkpoint, dict(page_state), dict(browser_state),
+                latest, oldest, copy_policy
+            )
+    
+    @staticmethod
+    def _build_checkpoint(
+        checkpoint: Checkpoint,
+        page_state: Dict,
+        browser_state: Dict,
+        latest: Optional[Checkpoint],
+        oldest: Optional[Checkpoint],
+        copy_policy: str
+    ) -> None:
+        """计算检查点的状态快照；oldest非空时表示发生了淘汰"""
+        latest_snapshot = latest.resolve().snapshot if latest else None
+        latest_browser_snapshot = latest.browser_snapshot if latest else None
+        checkpoint.snapshot = StateSnapshot.capture(page_state, latest_snapshot, copy_policy)
+        checkpoint.browser_snapshot = StateSnapshot.capture(browser_state, latest_browser_snapshot, copy_policy)
         
-        # 限制检查点数量
-        if len(self.checkpoints) > self.max_checkpoints:
-            self.checkpoints.pop(0)
+        # 最早的检查点被淘汰后，把新的最早检查点展开为完整快照以切断快照链
+        if oldest is not None:
+            oldest.snapshot.rebase()
+            oldest.browser_snapshot.rebase()
     
     def rollback_to_node(self, node_id: str) -> Optional[Checkpoint]:
         """
@@ -78,7 +247,7 @@ class RollbackManager:
                 })
                 
                 # 删除该检查点之后的所有检查点
-                self.checkpoints = self.checkpoints[:i+1]
+                self._truncate(i + 1)
                 
                 return checkpoint
                 
@@ -108,10 +277,15 @@ class RollbackManager:
         })
         
         # 删除目标检查点之后的所有检查点
-        self.checkpoints = self.checkpoints[:target_index+1]
+        self._truncate(target_index + 1)
         
         return checkpoint
     
+    def _truncate(self, size: int) -> None:
+        """只保留前size个检查点"""
+        while len(self.checkpoints) > size:
+            self.checkpoints.pop()
+    
     def get_latest_checkpoint(self) -> Optional[Checkpoint]:
         """获取最新检查点"""
         return self.checkpoints[-1] if self.checkpoints else None
@@ -138,11 +312,14 @@ class EnvironmentReset:
         
     def save_initial_state(self) -> None:
         """保存初始状态"""
-        self.initial_state = {
-            "url": self.browser.get_url(),
-            "cookies": self.browser.get_cookies(),
-            "local_storage": self.browser.get_local_storage()
-        }
+        if hasattr(self.browser, "get_storage_state"):
+            self.initial_state = self.browser.get_storage_state()
+        else:
+            self.initial_state = {
+                "url": self.browser.get_url(),
+                "cookies": self.browser.get_cookies(),
+                "local_storage": self.browser.get_local_storage()
+            }
     
     def reset_to_initial(self) -> None:
         """重置到初始状态"""
@@ -153,9 +330,8 @@ class EnvironmentReset:
         self.browser.clear_cookies()
         self.browser.clear_local_storage()
         
-        # 恢复初始cookies
-        for cookie in self.initial_state.get("cookies", []):
-            self.browser.set_cookie(cookie)
+        # 恢复初始cookies（一次批量设置）
+        self.browser.set_cookies(self.initial_state.get("cookies", []))
             
         # 导航到初始URL
         initial_url = self.initial_state.get("url")
@@ -168,10 +344,14 @@ class EnvironmentReset:
         
     def close_all_popups(self) -> None:
         """关闭所有弹窗"""
-        # 尝试多次按ESC
+        has_popup = getattr(self.browser, "has_popup", None)
+        
+        # 尝试多次按ESC（至少按一次），每次按后检查，弹窗消失后立即停止
         for _ in range(3):
             self.browser.press_key("Escape")
             self.browser.wait(500)
+            if has_popup is not None and not has_popup():
+                break
 
 
 class NoProgressDetector:
@@ -179,21 +359,55 @@ class NoProgressDetector:
     
     def __init__(self, window_size: int = 3):
         self.window_size = window_size
-        self.dom_hashes: List[str] = []
+        self.dom_hashes: "deque[Any]" = deque(maxlen=window_size)
+        # 上一次哈希的dom_elements对象及其哈希（COLLECT会整体替换该列表，未替换时直接复用）
+        self._last_elements: Any = None
+        self._last_elements_hash: Optional[bytes] = None
+        # 最近一次DOM状态及其连续出现次数
+        self._last_hash: Any = None
+        self._streak = 0
         
-    def record_dom_state(self, page_state: Dict) -> None:
-        """记录DOM状态"""
-        import hashlib
+    def record_dom_state(self, page_state: Dict, dom_hash: Optional[str] = None) -> None:
+        """
+        记录DOM状态
         
-        # 计算DOM的哈希值
-        dom_content = str(page_state.get("dom_elements", []))
-        dom_hash = hashlib.md5(dom_content.encode()).hexdigest()
+        状态由两部分组成：执行器等待页面稳定时得到的页面摘要（dom_hash，
+        不再重新获取页面内容）与dom_elements的哈希。
+        """
+        elements = page_state.get("dom_elements", [])
+        if elements is not self._last_elements or self._last_elements_hash is None:
+            self._last_elements = elements
+            self._last_elements_hash = self._hash_elements(elements)
+            
+        state = (dom_hash, self._last_elements_hash)
+        # 有界队列自动只保留最近window_size个
+        self.dom_hashes.append(state)
         
-        self.dom_hashes.append(dom_hash)
+        if state == self._last_hash:
+            self._streak += 1
+        else:
+            self._last_hash = state
+            self._streak = 1
+    
+    @staticmethod
+    def _hash_elements(elements) -> bytes:
+        """
+        计算DOM元素摘要，优先使用xxh3（否则BLAKE2b）
         
-        # 限制窗口大小
-        if len(self.dom_hashes) > self.window_size:
-            self.dom_hashes.pop(0)
+        元素可被JSON序列化时用orjson一次编码整个列表（键排序，结果规范），
+        否则（如ElementHandle）逐个元素取repr增量哈希，不拼接整个列表的字符串。
+        """
+        hasher = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+        if orjson is not None:
+            try:
+                hasher.update(orjson.dumps(elements, option=orjson.OPT_SORT_KEYS))
+                return hasher.digest()
+            except TypeError:  # orjson.JSONEncodeError：含不可序列化的元素
+                pass
+        for element in elements:
+            hasher.update(repr(element).encode())
+            hasher.update(b"\x00")
+        return hasher.digest()
     
     def detect_no_progress(self) -> bool:
         """
@@ -202,14 +416,15 @@ class NoProgressDetector:
         Returns:
             如果DOM连续不变则返回True
         """
-        if len(self.dom_hashes) < self.window_size:
-            return False
-            
-        # 检查最近的DOM哈希是否都相同
-        return len(set(self.dom_hashes)) == 1
+        # 最近window_size次DOM状态都相同，即同一状态连续出现了window_size次
+        return self._streak >= self.window_size
     
     def reset(self) -> None:
         """重置检测器"""
         self.dom_hashes.clear()
+        self._last_elements = None
+        self._last_elements_hash = None
+        self._last_hash = None
+        self._streak = 0
 
 
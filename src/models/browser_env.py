@@ -3,6 +3,59 @@ Browser Environment - 浏览器环境抽象层
 """
 from typing import List, Dict, Any, Optional
 from abc import ABC, abstractmethod
+import hashlib
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - 未安装时回退到hashlib
+    xxhash = None
+
+
+def _text_digest(text: str) -> str:
+    """页面文本摘要（非安全用途，优先使用xxh3）"""
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(text)
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+# 在页面内计算 body 文本的 长度:FNV-1a 摘要，只回传一个短字符串而不是整页文本
+_DOM_HASH_JS = """() => {
+    const text = document.body ? document.body.innerText : "";
+    let h = 0x811c9dc5;
+    for (let i = 0; i < text.length; i++) {
+        h ^= text.charCodeAt(i);
+        h = Math.imul(h, 0x01000193);
+    }
+    return text.length + ":" + (h >>> 0).toString(16);
+}"""
+
+# 一次往返取回 URL、标题与 body 文本
+_SNAPSHOT_JS = """() => ({
+    url: location.href,
+    title: document.title,
+    text_content: document.body ? document.body.innerText : ""
+})"""
+
+# 批量提取字段文本：返回与选择器一一对应的文本，未找到或不是合法CSS选择器时为null
+_EXTRACT_JS = """(selectors) => selectors.map((selector) => {
+    try {
+        const el = document.querySelector(selector);
+        return el ? el.innerText : null;
+    } catch (e) {
+        return null;
+    }
+})"""
+
+# 一次往返取回 URL 与 localStorage
+_STORAGE_STATE_JS = """() => ({
+    url: location.href,
+    local_storage: Object.assign({}, window.localStorage)
+})"""
+
+# 页面上是否有可见的弹窗/模态框
+_HAS_POPUP_JS = """() => Array.from(
+    document.querySelectorAll('dialog[open], [role="dialog"], [aria-modal="true"], .modal, .popup')
+).some((el) => el.getClientRects().length > 0)"""
 
 
 class BrowserEnvironment(ABC):
@@ -28,6 +81,18 @@ class BrowserEnvironment(ABC):
         """获取页面文本内容"""
         pass
     
+    def get_dom_hash(self) -> str:
+        """获取页面文本摘要，用于判断页面是否稳定（默认在本地对文本求摘要）"""
+        return _text_digest(self.get_text_content())
+    
+    def snapshot(self) -> Dict[str, str]:
+        """获取页面快照 {url, title, text_content}（默认分别调用三个接口）"""
+        return {
+            "url": self.get_url(),
+            "title": self.get_title(),
+            "text_content": self.get_text_content()
+        }
+    
     @abstractmethod
     def collect_elements(self, selector: str) -> List[Any]:
         """收集元素"""
@@ -73,6 +138,10 @@ class BrowserEnvironment(ABC):
         """按键"""
         pass
     
+    def has_popup(self) -> bool:
+        """页面上是否有可见弹窗（默认无法判断，返回True）"""
+        return True
+    
     @abstractmethod
     def scroll_to_bottom(self) -> None:
         """滚动到底部"""
@@ -88,6 +157,11 @@ class BrowserEnvironment(ABC):
         """设置cookie"""
         pass
     
+    def set_cookies(self, cookies: List[Dict]) -> None:
+        """批量设置cookies（默认逐个设置，子类可覆盖为单次调用）"""
+        for cookie in cookies:
+            self.set_cookie(cookie)
+    
     @abstractmethod
     def clear_cookies(self) -> None:
         """清除cookies"""
@@ -103,6 +177,14 @@ class BrowserEnvironment(ABC):
         """清除localStorage"""
         pass
     
+    def get_storage_state(self) -> Dict[str, Any]:
+        """获取浏览器状态 {url, cookies, local_storage}（默认分别调用三个接口）"""
+        return {
+            "url": self.get_url(),
+            "cookies": self.get_cookies(),
+            "local_storage": self.get_local_storage()
+        }
+    
     @abstractmethod
     def close(self) -> None:
         """关闭浏览器"""
@@ -149,6 +231,20 @@ class PlaywrightBrowser(BrowserEnvironment):
             return self.page.inner_text("body")
         return ""
     
+    def get_dom_hash(self) -> str:
+        if self.page:
+            digest = self.page.evaluate(_DOM_HASH_JS)
+            if isinstance(digest, str):
+                return digest
+        return super().get_dom_hash()
+    
+    def snapshot(self) -> Dict[str, str]:
+        if self.page:
+            state = self.page.evaluate(_SNAPSHOT_JS)
+            if isinstance(state, dict) and "url" in state:
+                return state
+        return super().snapshot()
+    
     def collect_elements(self, selector: str) -> List[Any]:
         if self.page:
             elements = self.page.query_selector_all(selector)
@@ -160,17 +256,33 @@ class PlaywrightBrowser(BrowserEnvironment):
         if not self.page:
             return data
             
-        for field in fields:
-            if isinstance(field, dict):
-                field_name = field.get("name")
-                field_selector = field.get("selector")
-                if field_selector:
-                    try:
-                        element = self.page.query_selector(field_selector)
-                        if element:
-                            data[field_name] = element.inner_text()
-                    except Exception:
-                        pass
+        pairs = [
+            (field.get("name"), field["selector"])
+            for field in fields
+            if isinstance(field, dict) and field.get("selector")
+        ]
+        if not pairs:
+            return data
+            
+        # 一次evaluate完成所有CSS查询；未命中的字段（Playwright专有选择器语法如text=、xpath=，
+        # 或位于shadow DOM中）再逐个用query_selector查询
+        try:
+            results = self.page.evaluate(_EXTRACT_JS, [selector for _, selector in pairs])
+        except Exception:
+            results = None
+        if not isinstance(results, list) or len(results) != len(pairs):
+            results = [None] * len(pairs)
+            
+        for (field_name, field_selector), text in zip(pairs, results):
+            if isinstance(text, str):
+                data[field_name] = text
+                continue
+            try:
+                element = self.page.query_selector(field_selector)
+                if element:
+                    data[field_name] = element.inner_text()
+            except Exception:
+                pass
         return data
     
     def click(self, selector: str, timeout: int = 5000) -> bool:
@@ -206,6 +318,13 @@ class PlaywrightBrowser(BrowserEnvironment):
         if self.page:
             self.page.keyboard.press(key)
     
+    def has_popup(self) -> bool:
+        if self.page:
+            visible = self.page.evaluate(_HAS_POPUP_JS)
+            if isinstance(visible, bool):
+                return visible
+        return super().has_popup()
+    
     def scroll_to_bottom(self) -> None:
         if self.page:
             self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
@@ -219,6 +338,10 @@ class PlaywrightBrowser(BrowserEnvironment):
         if self.page:
             self.page.context.add_cookies([cookie])
     
+    def set_cookies(self, cookies: List[Dict]) -> None:
+        if self.page and cookies:
+            self.page.context.add_cookies(list(cookies))
+    
     def clear_cookies(self) -> None:
         if self.page:
             self.page.context.clear_cookies()
@@ -232,6 +355,14 @@ class PlaywrightBrowser(BrowserEnvironment):
         if self.page:
             self.page.evaluate("() => window.localStorage.clear()")
     
+    def get_storage_state(self) -> Dict[str, Any]:
+        if self.page:
+            state = self.page.evaluate(_STORAGE_STATE_JS)
+            if isinstance(state, dict) and "url" in state:
+                state["cookies"] = self.page.context.cookies()
+                return state
+        return super().get_storage_state()
+    
     def close(self) -> None:
         if self.browser:
             self.browser.close()
@@ -2,31 +2,100 @@
 Model Loader - 支持多种LLM提供商
 """
 import os
-from typing import Dict, Optional
+import atexit
+import copy
+import functools
+import json
+import logging
+from typing import Any, Dict, Iterator, Optional
 
 try:
     from dotenv import load_dotenv
 except ImportError:  # pragma: no cover - graceful fallback when optional dependency is missing
     load_dotenv = None
 
+try:
+    import httpx
+except ImportError:  # pragma: no cover - httpx随openai一同安装，缺失时使用SDK默认客户端
+    httpx = None
+
+
+logger = logging.getLogger("GraphWebAgent.models")
+
+# 进程内共享的HTTP客户端：所有OpenAI兼容接口复用同一连接池，避免每个客户端重复TCP+TLS握手
+_SHARED_HTTP_CLIENT = None
+
+
+def _get_shared_http_client():
+    """获取共享的httpx客户端（首次调用时创建），httpx不可用时返回None"""
+    global _SHARED_HTTP_CLIENT
+    if _SHARED_HTTP_CLIENT is None and httpx is not None:
+        try:
+            import h2  # noqa: F401  HTTP/2需要h2包
+            http2 = True
+        except ImportError:
+            http2 = False
+        _SHARED_HTTP_CLIENT = httpx.Client(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+            timeout=120,
+            http2=http2
+        )
+        atexit.register(_SHARED_HTTP_CLIENT.close)
+    return _SHARED_HTTP_CLIENT
+
+
+@functools.lru_cache(maxsize=1)
+def _load_env_once() -> None:
+    """载入 .env 文件中的环境变量（进程内只执行一次）"""
+    if load_dotenv:
+        load_dotenv()
+
+
+def _env(*names: str) -> Optional[str]:
+    """按顺序返回第一个非空的环境变量值"""
+    return next((os.environ[name] for name in names if os.environ.get(name)), None)
+
+
+@functools.lru_cache(maxsize=None)
+def _openai_client(api_key: str, base_url: Optional[str] = None):
+    """按 (api_key, base_url) 缓存OpenAI兼容客户端，openai未安装时抛出ImportError（不缓存）"""
+    from openai import OpenAI
+    kwargs = {"base_url": base_url} if base_url else {}
+    return OpenAI(api_key=api_key, http_client=_get_shared_http_client(), **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def _anthropic_client(api_key: str):
+    """按api_key缓存Anthropic客户端，anthropic未安装时抛出ImportError（不缓存）"""
+    from anthropic import Anthropic
+    return Anthropic(api_key=api_key)
+
 
 class ModelLoader:
     """模型加载器 - 支持OpenAI、Anthropic、DeepSeek、Qwen等"""
     
+    # 模型名前缀 -> 加载方法
+    _LOADERS = {
+        "gpt": "_load_openai_model",
+        "claude": "_load_anthropic_model",
+        "deepseek": "_load_deepseek_model",
+        "qwen": "_load_qwen_model"
+    }
+    
     def __init__(self, config: Dict = None):
         self.config = config or {}
         
-        # 先尝试从 .env 文件加载（如果存在）
-        if load_dotenv:
-            load_dotenv()
+        # 先尝试从 .env 文件加载（如果存在，每个进程只查找一次）
+        _load_env_once()
+        
+        # 获取API密钥（优先级：环境变量 > .env文件 > config；.env已由load_dotenv载入环境变量）
+        self.openai_api_key = _env("OPENAI_API_KEY") or self.config.get("openai_api_key")
+        self.anthropic_api_key = _env("ANTHROPIC_API_KEY") or self.config.get("anthropic_api_key")
+        self.deepseek_api_key = _env("DEEPSEEK_API_KEY") or self.config.get("deepseek_api_key")
+        self.qwen_api_key = _env("QWEN_API_KEY", "DASHSCOPE_API_KEY") or self.config.get("qwen_api_key")
         
-        # 获取API密钥（优先级：环境变量 > .env文件 > config）
-        self.openai_api_key = os.environ.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") or self.config.get("openai_api_key")
-        self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY") or os.getenv("ANTHROPIC_API_KEY") or self.config.get("anthropic_api_key")
-        self.deepseek_api_key = os.environ.get("DEEPSEEK_API_KEY") or os.getenv("DEEPSEEK_API_KEY") or self.config.get("deepseek_api_key")
-        self.qwen_api_key = (os.environ.get("QWEN_API_KEY") or os.environ.get("DASHSCOPE_API_KEY") or 
-                            os.getenv("QWEN_API_KEY") or os.getenv("DASHSCOPE_API_KEY") or 
-                            self.config.get("qwen_api_key"))
+        # 模型名 -> 已加载的模型封装，重复加载同一模型时直接复用
+        self._model_cache: Dict[str, Any] = {}
         
     def load_model(self, model_name: str):
         """
@@ -38,69 +107,68 @@ class ModelLoader:
         - DeepSeek: deepseek-chat, deepseek-coder
         - Qwen: qwen-turbo, qwen-plus, qwen-max
         """
-        if model_name.startswith("gpt"):
-            return self._load_openai_model(model_name)
-        elif model_name.startswith("claude"):
-            return self._load_anthropic_model(model_name)
-        elif model_name.startswith("deepseek"):
-            return self._load_deepseek_model(model_name)
-        elif model_name.startswith("qwen"):
-            return self._load_qwen_model(model_name)
-        else:
+        model = self._model_cache.get(model_name)
+        if model is None:
+            model = self._model_cache[model_name] = self._create_model(model_name)
+        return model
+    
+    def _create_model(self, model_name: str):
+        """按模型名前缀选择提供商并创建模型封装"""
+        prefix = model_name.split("-", 1)[0]
+        handler = self._LOADERS.get(prefix)
+        if handler is None:
+            # 前缀后不带"-"的名称（如 qwen2.5-72b）按前缀匹配
+            handler = next((h for p, h in self._LOADERS.items() if model_name.startswith(p)), None)
+        if handler is None:
             # 使用Mock模型
-            print(f"警告: 未知模型 {model_name}，使用Mock模式")
+            logger.warning("未知模型 %s，使用Mock模式", model_name)
             return MockLLM(model_name)
+        return getattr(self, handler)(model_name)
     
     def _load_openai_model(self, model_name: str):
         """加载OpenAI模型"""
         if not self.openai_api_key:
-            print("警告: OpenAI API密钥未配置，使用Mock模式")
+            logger.warning("OpenAI API密钥未配置，使用Mock模式")
             return MockLLM(model_name)
         
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=self.openai_api_key)
+            client = _openai_client(self.openai_api_key)
             return OpenAILLM(client, model_name)
         except ImportError:
-            print("警告: openai包未安装")
+            logger.warning("openai包未安装")
             return MockLLM(model_name)
     
     def _load_anthropic_model(self, model_name: str):
         """加载Anthropic模型"""
         if not self.anthropic_api_key:
-            print("警告: Anthropic API密钥未配置，使用Mock模式")
+            logger.warning("Anthropic API密钥未配置，使用Mock模式")
             return MockLLM(model_name)
         
         try:
-            from anthropic import Anthropic
-            client = Anthropic(api_key=self.anthropic_api_key)
+            client = _anthropic_client(self.anthropic_api_key)
             return AnthropicLLM(client, model_name)
         except ImportError:
-            print("警告: anthropic包未安装")
+            logger.warning("anthropic包未安装")
             return MockLLM(model_name)
     
     def _load_deepseek_model(self, model_name: str):
         """加载DeepSeek模型"""
         if not self.deepseek_api_key:
-            print("警告: DeepSeek API密钥未配置，使用Mock模式")
+            logger.warning("DeepSeek API密钥未配置，使用Mock模式")
             return MockLLM(model_name)
         
         try:
-            from openai import OpenAI
             # DeepSeek使用OpenAI兼容接口
-            client = OpenAI(
-                api_key=self.deepseek_api_key,
-                base_url="https://api.deepseek.com"
-            )
+            client = _openai_client(self.deepseek_api_key, "https://api.deepseek.com")
             return DeepSeekLLM(client, model_name)
         except ImportError:
-            print("警告: openai包未安装（DeepSeek需要）")
+            logger.warning("openai包未安装（DeepSeek需要）")
             return MockLLM(model_name)
     
     def _load_qwen_model(self, model_name: str):
         """加载Qwen模型"""
         if not self.qwen_api_key:
-            print("警告: Qwen API密钥未配置，使用Mock模式")
+            logger.warning("Qwen API密钥未配置，使用Mock模式")
             return MockLLM(model_name)
         
         try:
@@ -109,23 +177,21 @@ class ModelLoader:
             dashscope.api_key = self.qwen_api_key
             return QwenLLM(model_name, self.qwen_api_key)
         except ImportError:
-            print("警告: dashscope包未安装，尝试使用OpenAI兼容接口")
+            logger.warning("dashscope包未安装，尝试使用OpenAI兼容接口")
             try:
-                from openai import OpenAI
                 # Qwen也支持OpenAI兼容接口
-                client = OpenAI(
-                    api_key=self.qwen_api_key,
-                    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-                )
+                client = _openai_client(self.qwen_api_key, "https://dashscope.aliyuncs.com/compatible-mode/v1")
                 return QwenCompatibleLLM(client, model_name)
             except ImportError:
-                print("警告: openai包未安装")
+                logger.warning("openai包未安装")
                 return MockLLM(model_name)
 
 
 class OpenAILLM:
     """OpenAI LLM封装"""
     
+    __slots__ = ("client", "model_name")
+    
     def __init__(self, client, model_name: str):
         self.client = client
         self.model_name = model_name
@@ -139,11 +205,26 @@ class OpenAILLM:
             temperature=kwargs.get("temperature", 0.1)
         )
         return response.choices[0].message.content
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 2000, **kwargs) -> Iterator[str]:
+        """流式生成响应，逐段产出文本"""
+        stream = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=kwargs.get("temperature", 0.1),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
 
 
 class AnthropicLLM:
     """Anthropic LLM封装"""
     
+    __slots__ = ("client", "model_name")
+    
     def __init__(self, client, model_name: str):
         self.client = client
         self.model_name = model_name
@@ -161,10 +242,12 @@ class AnthropicLLM:
 class DeepSeekLLM:
     """DeepSeek LLM封装（使用OpenAI兼容接口）"""
     
+    __slots__ = ("client", "model_name")
+    
     def __init__(self, client, model_name: str):
         self.client = client
         self.model_name = model_name
-        print(f"[OK] DeepSeek模型已加载: {model_name}")
+        logger.info("[OK] DeepSeek模型已加载: %s", model_name)
     
     def generate(self, prompt: str, max_tokens: int = 2000, **kwargs) -> str:
         """生成响应"""
@@ -178,17 +261,36 @@ class DeepSeekLLM:
             )
             return response.choices[0].message.content
         except Exception as e:
-            print(f"DeepSeek API调用失败: {e}")
+            logger.error("DeepSeek API调用失败: %s", e)
+            raise
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 2000, **kwargs) -> Iterator[str]:
+        """流式生成响应，逐段产出文本"""
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=kwargs.get("temperature", 0.1),
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        except Exception as e:
+            logger.error("DeepSeek API调用失败: %s", e)
             raise
 
 
 class QwenLLM:
     """Qwen LLM封装（使用DashScope SDK）"""
     
+    __slots__ = ("model_name", "api_key")
+    
     def __init__(self, model_name: str, api_key: str):
         self.model_name = model_name
         self.api_key = api_key
-        print(f"[OK] Qwen模型已加载: {model_name}")
+        logger.info("[OK] Qwen模型已加载: %s", model_name)
     
     def generate(self, prompt: str, max_tokens: int = 2000, **kwargs) -> str:
         """生成响应"""
@@ -209,17 +311,19 @@ class QwenLLM:
             else:
                 raise Exception(f"Qwen API错误: {response.message}")
         except Exception as e:
-            print(f"Qwen API调用失败: {e}")
+            logger.error("Qwen API调用失败: %s", e)
             raise
 
 
 class QwenCompatibleLLM:
     """Qwen LLM封装（使用OpenAI兼容接口）"""
     
+    __slots__ = ("client", "model_name")
+    
     def __init__(self, client, model_name: str):
         self.client = client
         self.model_name = model_name
-        print(f"[OK] Qwen模型已加载（兼容模式）: {model_name}")
+        logger.info("[OK] Qwen模型已加载（兼容模式）: %s", model_name)
     
     def generate(self, prompt: str, max_tokens: int = 2000, **kwargs) -> str:
         """生成响应"""
@@ -232,21 +336,29 @@ class QwenCompatibleLLM:
             )
             return response.choices[0].message.content
         except Exception as e:
-            print(f"Qwen API调用失败: {e}")
+            logger.error("Qwen API调用失败: %s", e)
+            raise
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 2000, **kwargs) -> Iterator[str]:
+        """流式生成响应，逐段产出文本"""
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=kwargs.get("temperature", 0.1),
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        except Exception as e:
+            logger.error("Qwen API调用失败: %s", e)
             raise
 
 
-class MockLLM:
-    """Mock LLM（用于测试）"""
-    
-    def __init__(self, model_name: str):
-        self.model_name = model_name
-        print(f"[MOCK] 使用Mock模式: {model_name}")
-    
-    def generate(self, prompt: str, **kwargs) -> str:
-        """返回Mock响应"""
-        # 返回一个简单的任务图JSON
-        return '''
+# MockLLM返回的任务图：JSON文本与解析结果均只构建一次
+_MOCK_GRAPH_JSON = '''
 {
   "nodes": [
     {
@@ -269,3 +381,22 @@ class MockLLM:
   "edges": [["N1", "N2"]]
 }
 '''
+_MOCK_GRAPH = json.loads(_MOCK_GRAPH_JSON)
+
+
+class MockLLM:
+    """Mock LLM（用于测试）"""
+    
+    __slots__ = ("model_name",)
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        logger.info("[MOCK] 使用Mock模式: %s", model_name)
+    
+    def generate(self, prompt: str, **kwargs) -> str:
+        """返回Mock响应（一个简单的任务图JSON）"""
+        return _MOCK_GRAPH_JSON
+    
+    def generate_parsed(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """返回已解析的Mock任务图（独立副本，调用方可直接修改）"""
+        return copy.deepcopy(_MOCK_GRAPH)
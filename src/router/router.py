@@ -1,11 +1,17 @@
 """
 Cost-aware Router - 成本感知路由器
 """
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from collections import Counter
 from dataclasses import dataclass, field
 from enum import Enum
 
 
+# DOM复杂度：元素数与文本长度各占一半权重，分别在1000个元素、10000字符时饱和
+_ELEMENT_WEIGHT = 0.5 / 1000
+_TEXT_WEIGHT = 0.5 / 10000
+
+
 class ModelTier(Enum):
     """模型层级"""
     NO_LLM = "no_llm"  # 不使用LLM，直接DOM解析
@@ -13,7 +19,43 @@ class ModelTier(Enum):
     LARGE = "large"  # 大模型（如gpt-4）
 
 
-@dataclass
+# 各模型层级对应的CostStats计数字段
+_TIER_STAT_FIELDS = {
+    ModelTier.NO_LLM: "no_llm_calls",
+    ModelTier.SMALL: "small_model_calls",
+    ModelTier.LARGE: "large_model_calls",
+}
+
+
+def _all_fields_have_selector(fields) -> bool:
+    """EXTRACT的所有字段是否都带有selector（空字段列表视为是）"""
+    for f in fields:
+        # 字段几乎总是普通dict，先做精确类型比较，子类再退回isinstance
+        if not ((type(f) is dict or isinstance(f, dict)) and "selector" in f):
+            return False
+    return True
+
+
+# 各节点类型"无需LLM即可直接解析"的判定（参数 -> bool）
+_DIRECT_PARSE_RULES: Dict[str, Callable[[Dict], bool]] = {
+    # NAVIGATE节点如果有明确URL，不需要LLM
+    "NAVIGATE": lambda params: bool(params.get("url")),
+    # COLLECT节点如果有明确selector，不需要LLM
+    "COLLECT": lambda params: bool(params.get("selector")),
+    # EXTRACT节点如果所有字段都有selector，不需要LLM
+    "EXTRACT": lambda params: _all_fields_have_selector(params.get("fields", ())),
+    # ACT节点如果有明确target，不需要LLM
+    "ACT": lambda params: bool(params.get("target")),
+}
+
+
+def _is_direct_parseable(node: Dict) -> bool:
+    """判断节点是否无需LLM即可直接解析（只取决于节点类型与参数）"""
+    rule = _DIRECT_PARSE_RULES.get(node.get("type"))
+    return bool(rule and rule(node.get("params", {})))
+
+
+@dataclass(slots=True)
 class CostStats:
     """成本统计"""
     total_calls: int = 0
@@ -22,7 +64,7 @@ class CostStats:
     large_model_calls: int = 0
     total_tokens: int = 0
     total_cost: float = 0.0
-    calls_by_node: Dict[str, int] = field(default_factory=dict)
+    calls_by_node: Dict[str, int] = field(default_factory=Counter)
 
 
 class CostAwareRouter:
@@ -42,9 +84,27 @@ class CostAwareRouter:
         self.upgrade_threshold = self.config.get("upgrade_after_failures", 3)
         self.dom_complexity_threshold = self.config.get("use_llm_threshold", 0.5)
         
+        # 每token单价 (输入, 输出)，未定价的模型为None（不计成本）
+        self._small_rate = self._token_rate(self.small_model)
+        self._large_rate = self._token_rate(self.large_model)
+        
+        # 层级 -> 模型名 / 每token单价，记录调用和查询模型名时一次查表
+        self._tier_model: Dict[ModelTier, Optional[str]] = {
+            ModelTier.NO_LLM: None,
+            ModelTier.SMALL: self.small_model,
+            ModelTier.LARGE: self.large_model,
+        }
+        self._tier_rate: Dict[ModelTier, Optional[Tuple[float, float]]] = {
+            ModelTier.SMALL: self._small_rate,
+            ModelTier.LARGE: self._large_rate,
+        }
+        
         # 统计信息
         self.stats = CostStats()
-        self.failure_counts: Dict[str, int] = {}
+        self.failure_counts: Dict[str, int] = Counter()
+        # 上一次评估复杂度的(dom_elements, text_content)对象及结果（页面未变时两者不会被替换）
+        self._complexity_key: Any = None
+        self._complexity: float = 0.0
         
     def route(
         self,
@@ -63,47 +123,74 @@ class CostAwareRouter:
         Returns:
             模型层级
         """
-        node_id = node.get("id")
-        node_type = node.get("type")
+        tier = self._decide_tier(node, page_state)
+        self._count_tier(tier)
+        return tier
+    
+    def route_batch(self, nodes: List[Dict], page_state: Dict) -> List[ModelTier]:
+        """
+        对共享同一页面状态的多个节点批量路由
+        
+        与逐个调用route()结果相同，但页面复杂度只评估一次，统计在最后一次性累计。
+        
+        Args:
+            nodes: 节点列表
+            page_state: 页面状态
+            
+        Returns:
+            与nodes一一对应的模型层级列表
+        """
+        can_parse = self._can_parse_directly
+        failure_counts = self.failure_counts
+        upgrade_threshold = self.upgrade_threshold
         
+        # 复杂度只与页面有关，按需求一次（全部节点可直接解析时不评估）
+        is_complex = None
+        tiers = []
+        for node in nodes:
+            if can_parse(node, page_state):
+                tier = ModelTier.NO_LLM
+            elif failure_counts[node.get("id")] >= upgrade_threshold:
+                tier = ModelTier.LARGE
+            else:
+                if is_complex is None:
+                    is_complex = self._evaluate_dom_complexity(page_state) > self.dom_complexity_threshold
+                tier = ModelTier.LARGE if is_complex else ModelTier.SMALL
+            tiers.append(tier)
+            
+        for tier, count in Counter(tiers).items():
+            self._count_tier(tier, count)
+        return tiers
+    
+    def _decide_tier(self, node: Dict, page_state: Dict) -> ModelTier:
+        """按规则选择模型层级（不更新统计）"""
         # 规则1: DOM可直接解析的节点不使用LLM
         if self._can_parse_directly(node, page_state):
-            self.stats.no_llm_calls += 1
             return ModelTier.NO_LLM
         
-        # 规则2: 检查该节点的失败次数
-        failure_count = self.failure_counts.get(node_id, 0)
-        if failure_count >= self.upgrade_threshold:
-            # 升级到大模型
-            self.stats.large_model_calls += 1
+        # 规则2: 检查该节点的失败次数，达到阈值升级到大模型
+        if self.failure_counts[node.get("id")] >= self.upgrade_threshold:
             return ModelTier.LARGE
         
-        # 规则3: 评估DOM复杂度
-        complexity = self._evaluate_dom_complexity(page_state)
-        if complexity > self.dom_complexity_threshold:
-            # 复杂页面使用大模型
-            self.stats.large_model_calls += 1
+        # 规则3: 评估DOM复杂度，复杂页面使用大模型
+        if self._evaluate_dom_complexity(page_state) > self.dom_complexity_threshold:
             return ModelTier.LARGE
         
-        # 规则4: 某些节点类型优先使用小模型
-        if node_type in ["VERIFY", "EXTRACT"]:
-            self.stats.small_model_calls += 1
-            return ModelTier.SMALL
-        
-        # 默认使用小模型
-        self.stats.small_model_calls += 1
+        # 规则4: 其余节点（含VERIFY/EXTRACT）使用小模型
         return ModelTier.SMALL
     
+    def _count_tier(self, tier: ModelTier, count: int = 1) -> None:
+        """累计某层级的路由次数"""
+        field_name = _TIER_STAT_FIELDS[tier]
+        setattr(self.stats, field_name, getattr(self.stats, field_name) + count)
+    
     def record_failure(self, node_id: str) -> None:
         """记录节点失败"""
-        if node_id not in self.failure_counts:
-            self.failure_counts[node_id] = 0
         self.failure_counts[node_id] += 1
     
     def record_success(self, node_id: str) -> None:
         """记录节点成功（重置失败计数）"""
-        if node_id in self.failure_counts:
-            self.failure_counts[node_id] = 0
+        self.failure_counts.pop(node_id, None)
     
     def record_call(
         self,
@@ -124,35 +211,29 @@ class CostAwareRouter:
         self.stats.total_calls += 1
         
         # 记录每个节点的调用次数
-        if node_id not in self.stats.calls_by_node:
-            self.stats.calls_by_node[node_id] = 0
         self.stats.calls_by_node[node_id] += 1
         
-        # 计算成本
-        if model_tier == ModelTier.SMALL:
-            model_name = self.small_model
-        elif model_tier == ModelTier.LARGE:
-            model_name = self.large_model
-        else:
+        # 计算成本（不使用LLM或模型未定价时不计）
+        rate = self._tier_rate.get(model_tier)
+        if rate is None:
             return
         
-        if model_name in self.MODEL_PRICES:
-            prices = self.MODEL_PRICES[model_name]
-            cost = (input_tokens / 1000 * prices["input"] + 
-                   output_tokens / 1000 * prices["output"])
-            
-            self.stats.total_tokens += (input_tokens + output_tokens)
-            self.stats.total_cost += cost
+        cost = input_tokens * rate[0] + output_tokens * rate[1]
+        
+        self.stats.total_tokens += (input_tokens + output_tokens)
+        self.stats.total_cost += cost
+    
+    @classmethod
+    def _token_rate(cls, model_name: str) -> Optional[Tuple[float, float]]:
+        """将每1K tokens价格换算为每token单价 (输入, 输出)"""
+        prices = cls.MODEL_PRICES.get(model_name)
+        if prices is None:
+            return None
+        return (prices["input"] / 1000.0, prices["output"] / 1000.0)
     
     def get_model_name(self, model_tier: ModelTier) -> Optional[str]:
         """获取模型名称"""
-        if model_tier == ModelTier.NO_LLM:
-            return None
-        elif model_tier == ModelTier.SMALL:
-            return self.small_model
-        elif model_tier == ModelTier.LARGE:
-            return self.large_model
-        return None
+        return self._tier_model.get(model_tier)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
@@ -177,29 +258,7 @@ class CostAwareRouter:
         Returns:
             True表示可以直接解析
         """
-        node_type = node.get("type")
-        params = node.get("params", {})
-        
-        # NAVIGATE节点如果有明确URL，不需要LLM
-        if node_type == "NAVIGATE" and params.get("url"):
-            return True
-        
-        # COLLECT节点如果有明确selector，不需要LLM
-        if node_type == "COLLECT" and params.get("selector"):
-            return True
-        
-        # EXTRACT节点如果有明确字段定义，可能不需要LLM
-        if node_type == "EXTRACT":
-            fields = params.get("fields", [])
-            # 如果所有字段都有selector，不需要LLM
-            if all(isinstance(f, dict) and "selector" in f for f in fields):
-                return True
-        
-        # ACT节点如果有明确target，不需要LLM
-        if node_type == "ACT" and params.get("target"):
-            return True
-        
-        return False
+        return _is_direct_parseable(node)
     
     def _evaluate_dom_complexity(self, page_state: Dict) -> float:
         """
@@ -208,24 +267,27 @@ class CostAwareRouter:
         Returns:
             复杂度分数 [0, 1]
         """
-        dom_elements = page_state.get("dom_elements", [])
+        dom_elements = page_state.get("dom_elements", ())
         text_content = page_state.get("text_content", "")
         
-        # 简单的复杂度评估
-        element_count = len(dom_elements)
-        text_length = len(text_content)
+        # 同一页面上的连续路由直接复用上次结果（按对象身份比较，列表长度兼顾原地追加）
+        key = self._complexity_key
+        if (key is not None and key[0] is dom_elements and key[1] is text_content
+                and key[2] == len(dom_elements)):
+            return self._complexity
         
-        # 归一化
-        element_score = min(element_count / 1000, 1.0)  # 假设1000个元素为高复杂度
-        text_score = min(text_length / 10000, 1.0)  # 假设10000字符为高复杂度
-        
-        # 综合评分
-        complexity = (element_score + text_score) / 2
+        # 两项各自归一化到[0, 0.5]后相加
+        element_count = len(dom_elements)
+        complexity = (min(element_count * _ELEMENT_WEIGHT, 0.5) +
+                      min(len(text_content) * _TEXT_WEIGHT, 0.5))
         
+        self._complexity_key = (dom_elements, text_content, element_count)
+        self._complexity = complexity
         return complexity
     
     def reset_stats(self) -> None:
         """重置统计信息"""
         self.stats = CostStats()
         self.failure_counts.clear()
+        self._complexity_key = None
 
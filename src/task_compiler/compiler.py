@@ -2,12 +2,56 @@
 Task Compiler - 将自然语言任务编译为结构化任务图
 """
 import json
-import re
+import time
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from enum import Enum
 
 
+def _created_at() -> str:
+    """图元数据中的创建时间（ISO 8601，精确到秒）"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+# 编译提示词模板（{task}为任务描述，其余花括号已转义）
+_PROMPT_TEMPLATE = """你是一个Web任务编译器。将以下自然语言任务转换为结构化任务图。
+
+任务描述: {task}
+
+可用节点类型:
+- NAVIGATE: 导航到URL
+- COLLECT: 收集页面元素列表
+- EXTRACT: 提取特定信息
+- COMPUTE: 计算或处理数据
+- ACT: 执行操作（点击、输入等）
+- VERIFY: 验证状态
+- ITERATE: 迭代处理
+- BRANCH: 条件分支
+
+输出JSON格式:
+{{
+  "nodes": [
+    {{
+      "id": "N1",
+      "type": "NAVIGATE",
+      "goal": "导航到搜索页面",
+      "predicate": "URL包含/search",
+      "idempotent": true,
+      "params": {{"url": "https://example.com/search"}}
+    }}
+  ],
+  "edges": [["N1", "N2"]]
+}}
+
+要求:
+1. 图必须无环
+2. 所有节点必须可达
+3. 至少有一个终止节点
+4. 节点ID格式: N1, N2, N3...
+
+请输出任务图JSON:"""
+
+
 class NodeType(Enum):
     """任务节点类型"""
     NAVIGATE = "NAVIGATE"
@@ -68,60 +112,27 @@ class TaskCompiler:
     
     def _build_compilation_prompt(self, task_description: str) -> str:
         """构建编译提示词"""
-        return f"""你是一个Web任务编译器。将以下自然语言任务转换为结构化任务图。
-
-任务描述: {task_description}
-
-可用节点类型:
-- NAVIGATE: 导航到URL
-- COLLECT: 收集页面元素列表
-- EXTRACT: 提取特定信息
-- COMPUTE: 计算或处理数据
-- ACT: 执行操作（点击、输入等）
-- VERIFY: 验证状态
-- ITERATE: 迭代处理
-- BRANCH: 条件分支
-
-输出JSON格式:
-{{
-  "nodes": [
-    {{
-      "id": "N1",
-      "type": "NAVIGATE",
-      "goal": "导航到搜索页面",
-      "predicate": "URL包含/search",
-      "idempotent": true,
-      "params": {{"url": "https://example.com/search"}}
-    }}
-  ],
-  "edges": [["N1", "N2"]]
-}}
-
-要求:
-1. 图必须无环
-2. 所有节点必须可达
-3. 至少有一个终止节点
-4. 节点ID格式: N1, N2, N3...
-
-请输出任务图JSON:"""
+        return _PROMPT_TEMPLATE.format_map({"task": task_description})
     
     def _parse_llm_response(self, response: str, task_id: str) -> Dict:
         """解析LLM响应"""
-        # 提取JSON部分
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        if not json_match:
+        # 提取JSON部分：第一个"{"到最后一个"}"（与贪婪匹配 \{.*\} 的范围相同，无需正则回溯）
+        start = response.find("{")
+        end = response.rfind("}")
+        if start == -1 or end < start:
             raise ValueError("无法从响应中提取JSON")
             
-        graph_data = json.loads(json_match.group())
+        graph_data = json.loads(response[start:end + 1])
         
         # 添加元数据
         task_graph = {
             "task_id": task_id,
             "task_description": "",
             "nodes": graph_data.get("nodes", []),
-            "edges": graph_data.get("edges", []),
+            # 边统一为(起点, 终点)元组：比二元列表更省内存，且不可变
+            "edges": [tuple(edge) if isinstance(edge, list) else edge for edge in graph_data.get("edges", [])],
             "metadata": {
-                "created_at": datetime.now().isoformat(),
+                "created_at": _created_at(),
                 "compiler_version": self.version,
                 "estimated_steps": len(graph_data.get("nodes", []))
             }
@@ -153,9 +164,9 @@ class TaskCompiler:
                     "control_flow": None  # 用于ITERATE/BRANCH的控制流信息
                 }
             ],
-            "edges": [["N1", "N2"]],
+            "edges": [("N1", "N2")],
             "metadata": {
-                "created_at": datetime.now().isoformat(),
+                "created_at": _created_at(),
                 "compiler_version": self.version,
                 "estimated_steps": 2,
                 "fallback": True
@@ -1,8 +1,12 @@
 """
 Graph Validator - 验证任务图的合法性
 """
-from typing import Dict, List, Set, Tuple, Any
+from typing import Dict, List, Optional, Set, Tuple, Any
 from collections import defaultdict, deque
+from operator import itemgetter
+
+
+_NODE_ID = itemgetter("id")
 
 
 class ValidationError(Exception):
@@ -21,6 +25,9 @@ class GraphValidator:
     
     REQUIRED_NODE_FIELDS = {"id", "type", "goal", "predicate"}
     
+    # 不超过该节点数的图先走线性扫描的快速路径（LLM生成的任务图大多在10个节点以内）
+    SMALL_GRAPH_SIZE = 16
+    
     def __init__(self, auto_fix: bool = True):
         """
         Args:
@@ -29,6 +36,8 @@ class GraphValidator:
         self.auto_fix = auto_fix
         self.errors = []
         self.warnings = []
+        self._graph_cache = None  # (nodes, edges, 图结构)，validate期间复用
+        self._node_ids_cache = None  # (nodes, 节点ID集合)，由节点验证得到
         
     def validate(self, task_graph: Dict[str, Any]) -> Tuple[bool, List[str]]:
         """
@@ -42,7 +51,15 @@ class GraphValidator:
         """
         self.errors = []
         self.warnings = []
-        
+        try:
+            return self._validate(task_graph)
+        finally:
+            # 各阶段共享的中间结构只在本次验证内有效，结束后释放
+            self._graph_cache = None
+            self._node_ids_cache = None
+    
+    def _validate(self, task_graph: Dict[str, Any]) -> Tuple[bool, List[str]]:
+        """依次执行各项验证"""
         # 基本结构检查
         if not self._check_basic_structure(task_graph):
             return False, self.errors
@@ -50,6 +67,10 @@ class GraphValidator:
         nodes = task_graph.get("nodes", [])
         edges = task_graph.get("edges", [])
         
+        # 小图快速路径：合法时直接通过；有任何问题都交给下面的完整验证生成错误信息
+        if len(nodes) <= self.SMALL_GRAPH_SIZE and self._is_valid_small(nodes, edges):
+            return True, self.errors
+        
         # 节点验证
         if not self._validate_nodes(nodes):
             return False, self.errors
@@ -65,6 +86,8 @@ class GraphValidator:
                 self._fix_topology(task_graph)
                 nodes = task_graph.get("nodes", [])
                 edges = task_graph.get("edges", [])
+                self._graph_cache = None
+                self._node_ids_cache = None
 
                 # 清理上一轮“图中存在环”的错误，避免重复
                 self.errors = [e for e in self.errors if e != "图中存在环"]
@@ -80,6 +103,53 @@ class GraphValidator:
             
         return True, self.errors
     
+    def _is_valid_small(self, nodes: List[Dict], edges: List[List[str]]) -> bool:
+        """
+        小图快速检查：只用列表和线性扫描，不构建字典/集合
+        
+        Returns:
+            True表示图完全合法（节点、边、无环、可达）；False只表示需要完整验证
+        """
+        if not nodes:
+            return False
+            
+        required_fields = self.REQUIRED_NODE_FIELDS
+        valid_types = self.VALID_NODE_TYPES
+        ids = []
+        for node in nodes:
+            if not required_fields.issubset(node) or node["type"] not in valid_types:
+                return False
+            node_id = node["id"]
+            if node_id in ids:
+                return False
+            ids.append(node_id)
+            
+        num_nodes = len(ids)
+        succ = [[] for _ in range(num_nodes)]
+        in_degree = [0] * num_nodes
+        for edge in edges:
+            if len(edge) != 2:
+                return False
+            from_node, to_node = edge
+            if from_node not in ids or to_node not in ids:
+                return False
+            to_idx = ids.index(to_node)
+            succ[ids.index(from_node)].append(to_idx)
+            in_degree[to_idx] += 1
+            
+        # Kahn排序能排出全部节点即无环，无环图中所有节点均可达
+        stack = [i for i in range(num_nodes) if in_degree[i] == 0]
+        processed = 0
+        while stack:
+            node = stack.pop()
+            processed += 1
+            for neighbor in succ[node]:
+                in_degree[neighbor] -= 1
+                if in_degree[neighbor] == 0:
+                    stack.append(neighbor)
+                    
+        return processed == num_nodes
+    
     def _check_basic_structure(self, task_graph: Dict) -> bool:
         """检查基本结构"""
         if not isinstance(task_graph, dict):
@@ -103,81 +173,46 @@ class GraphValidator:
             return False
             
         node_ids = set()
+        required_fields = self.REQUIRED_NODE_FIELDS
+        valid_types = self.VALID_NODE_TYPES
         
         for i, node in enumerate(nodes):
             # 检查必需字段
-            missing_fields = self.REQUIRED_NODE_FIELDS - set(node.keys())
-            if missing_fields:
+            if not required_fields.issubset(node):
+                missing_fields = required_fields - node.keys()
                 self.errors.append(f"节点{i}缺少字段: {missing_fields}")
                 return False
                 
-            # 检查节点ID唯一性
-            node_id = node.get("id")
+            # 检查节点ID唯一性（必需字段已确认存在，直接取值）
+            node_id = node["id"]
             if node_id in node_ids:
                 self.errors.append(f"节点ID重复: {node_id}")
                 return False
             node_ids.add(node_id)
             
             # 检查节点类型
-            node_type = node.get("type")
-            if node_type not in self.VALID_NODE_TYPES:
+            node_type = node["type"]
+            if node_type not in valid_types:
                 self.errors.append(f"无效的节点类型: {node_type}")
                 return False
                 
+        self._node_ids_cache = (nodes, node_ids)
         return True
     
     def _validate_edges(self, edges: List[List[str]], nodes: List[Dict]) -> bool:
         """验证边"""
-        node_ids = {node["id"] for node in nodes}
-        
-        for edge in edges:
-            if len(edge) != 2:
-                self.errors.append(f"边格式错误: {edge}")
-                return False
-                
-            from_node, to_node = edge
-            
-            if from_node not in node_ids:
-                self.errors.append(f"边引用了不存在的节点: {from_node}")
-                return False
-                
-            if to_node not in node_ids:
-                self.errors.append(f"边引用了不存在的节点: {to_node}")
-                return False
-                
-        return True
+        return self._get_graph(nodes, edges) is not None
     
     def _validate_topology(self, nodes: List[Dict], edges: List[List[str]]) -> bool:
         """验证拓扑结构（无环）"""
-        # 构建邻接表
-        graph = defaultdict(list)
-        for from_node, to_node in edges:
-            graph[from_node].append(to_node)
-            
-        # DFS检测环
-        visited = set()
-        rec_stack = set()
-        
-        def has_cycle(node: str) -> bool:
-            visited.add(node)
-            rec_stack.add(node)
+        graph = self._get_graph(nodes, edges)
+        if graph is None:
+            return False
             
-            for neighbor in graph[node]:
-                if neighbor not in visited:
-                    if has_cycle(neighbor):
-                        return True
-                elif neighbor in rec_stack:
-                    return True
-                    
-            rec_stack.remove(node)
+        if len(graph[4]) != len(nodes):
+            self.errors.append("图中存在环")
             return False
-        
-        for node in [n["id"] for n in nodes]:
-            if node not in visited:
-                if has_cycle(node):
-                    self.errors.append("图中存在环")
-                    return False
-                    
+            
         return True
     
     def _validate_reachability(self, nodes: List[Dict], edges: List[List[str]]) -> bool:
@@ -185,52 +220,169 @@ class GraphValidator:
         if not nodes:
             return True
             
-        # 构建邻接表
-        graph = defaultdict(list)
-        in_degree = defaultdict(int)
+        graph = self._get_graph(nodes, edges)
+        if graph is None:
+            return False
+        idx_to_id, succ, in_degree, node_ids, order = graph
         
-        for from_node, to_node in edges:
-            graph[from_node].append(to_node)
-            in_degree[to_node] += 1
+        # 无环图中每个节点都能沿前驱回溯到某个入度为0的节点，拓扑序完整即全部可达
+        if len(order) == len(nodes):
+            return True
             
         # 找到起始节点（入度为0）
-        start_nodes = [n["id"] for n in nodes if in_degree[n["id"]] == 0]
+        start_nodes = [i for i, degree in enumerate(in_degree) if degree == 0]
         
         if not start_nodes:
             self.warnings.append("没有找到起始节点（入度为0）")
             # 使用第一个节点作为起始节点
-            start_nodes = [nodes[0]["id"]]
+            start_nodes = [0]
             
-        # BFS检查可达性
-        reachable = set()
+        # BFS检查可达性（按节点下标记录访问状态）
+        reachable = bytearray(len(idx_to_id))
+        reached = 0
         queue = deque(start_nodes)
         
         while queue:
             node = queue.popleft()
-            if node in reachable:
+            if reachable[node]:
                 continue
-            reachable.add(node)
+            reachable[node] = 1
+            reached += 1
             
-            for neighbor in graph[node]:
-                if neighbor not in reachable:
+            for neighbor in succ[node]:
+                if not reachable[neighbor]:
                     queue.append(neighbor)
                     
-        # 检查是否所有节点都可达
-        all_nodes = {n["id"] for n in nodes}
-        unreachable = all_nodes - reachable
+        # 检查是否所有节点都可达（只在失败时构建不可达节点集合用于报错）
+        if reached == len(idx_to_id):
+            return True
+            
+        unreachable = {idx_to_id[i] for i, seen in enumerate(reachable) if not seen}
+        self.errors.append(f"以下节点不可达: {unreachable}")
+        return False
+    
+    def _get_graph(self, nodes: List[Dict], edges: List[List[str]]) -> Optional[tuple]:
+        """返回(nodes, edges)对应的图结构，同一对列表只构建一次"""
+        cache = self._graph_cache
+        if cache is None or cache[0] is not nodes or cache[1] is not edges:
+            cache = (nodes, edges, self._build_and_validate_graph(nodes, edges))
+            self._graph_cache = cache
+        return cache[2]
+    
+    def _build_and_validate_graph(
+        self,
+        nodes: List[Dict],
+        edges: List[List[str]]
+    ) -> Optional[Tuple[List[str], List[List[int]], List[int], Set[str], List[str]]]:
+        """
+        一次遍历节点、一次遍历边：校验边的格式与端点，同时构建邻接表和入度表，随后执行Kahn排序
         
-        if unreachable:
-            self.errors.append(f"以下节点不可达: {unreachable}")
-            return False
+        节点按出现顺序重新编号为0..N-1，邻接表与入度表均以下标索引，
+        遍历时不再对字符串ID做哈希。
+        
+        Returns:
+            (下标->节点ID, 后继邻接表, 入度表, 节点ID集合, 拓扑序(节点ID))；边不合法时记录错误并返回None
+        """
+        idx_to_id = list(map(_NODE_ID, nodes))
+        id_to_idx = {node_id: i for i, node_id in enumerate(idx_to_id)}
+        cached = self._node_ids_cache
+        node_ids = cached[1] if cached is not None and cached[0] is nodes else set(id_to_idx)
+        
+        num_nodes = len(idx_to_id)
+        succ: List[List[int]] = [[] for _ in range(num_nodes)]
+        in_degree = [0] * num_nodes
+        for edge in edges:
+            if len(edge) != 2:
+                self.errors.append(f"边格式错误: {edge}")
+                return None
+                
+            from_node, to_node = edge
             
-        return True
+            from_idx = id_to_idx.get(from_node)
+            if from_idx is None:
+                self.errors.append(f"边引用了不存在的节点: {from_node}")
+                return None
+                
+            to_idx = id_to_idx.get(to_node)
+            if to_idx is None:
+                self.errors.append(f"边引用了不存在的节点: {to_node}")
+                return None
+                
+            succ[from_idx].append(to_idx)
+            in_degree[to_idx] += 1
+            
+        order = [idx_to_id[i] for i in self._kahn_indexed(succ, in_degree)]
+        return idx_to_id, succ, in_degree, node_ids, order
+    
+    @staticmethod
+    def _kahn_indexed(succ: List[List[int]], in_degree: List[int]) -> List[int]:
+        """在下标邻接表上执行Kahn算法，返回节点下标的拓扑序（不修改in_degree）"""
+        remaining = in_degree[:]
+        queue = deque([i for i, degree in enumerate(remaining) if degree == 0])
+        result = []
+        
+        while queue:
+            node = queue.popleft()
+            result.append(node)
+            
+            for neighbor in succ[node]:
+                remaining[neighbor] -= 1
+                if remaining[neighbor] == 0:
+                    queue.append(neighbor)
+                    
+        return result
     
     def _fix_topology(self, task_graph: Dict) -> None:
-        """尝试修复拓扑问题"""
-        # 简单修复：移除导致环的边
-        # 这是一个简化实现，实际可能需要更复杂的逻辑
+        """
+        尝试修复拓扑问题：移除导致环的边
+        
+        按节点顺序做一次迭代DFS，指向当前DFS路径上节点的边（回边）即闭合环的边，
+        全部移除后图必然无环。回边只会出现在强连通分量内部，因此不影响环之外的边；
+        整个过程O(V+E)，无需反复重新验证。
+        """
         self.warnings.append("尝试自动修复拓扑问题")
         
+        nodes = task_graph.get("nodes", [])
+        edges = task_graph.get("edges", [])
+        id_to_idx = {node["id"]: i for i, node in enumerate(nodes)}
+        
+        # 出边以边下标记录，便于按原顺序删除
+        out_edges: List[List[int]] = [[] for _ in nodes]
+        targets: List[int] = []
+        for edge_idx, (from_node, to_node) in enumerate(edges):
+            out_edges[id_to_idx[from_node]].append(edge_idx)
+            targets.append(id_to_idx[to_node])
+            
+        # 0=未访问 1=在当前DFS路径上 2=已完成
+        state = bytearray(len(nodes))
+        removed = set()
+        for root in range(len(nodes)):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(out_edges[root]))]
+            while stack:
+                node, pending = stack[-1]
+                for edge_idx in pending:
+                    target = targets[edge_idx]
+                    if state[target] == 1:
+                        removed.add(edge_idx)
+                    elif state[target] == 0:
+                        state[target] = 1
+                        stack.append((target, iter(out_edges[target])))
+                        break
+                else:
+                    state[node] = 2
+                    stack.pop()
+                    
+        if not removed:
+            return
+            
+        for edge_idx in sorted(removed):
+            from_node, to_node = edges[edge_idx]
+            self.warnings.append(f"移除成环的边: {from_node} -> {to_node}")
+        task_graph["edges"] = [edge for i, edge in enumerate(edges) if i not in removed]
+        
     def get_topological_order(self, nodes: List[Dict], edges: List[List[str]]) -> List[str]:
         """
         获取拓扑排序
@@ -238,7 +390,21 @@ class GraphValidator:
         Returns:
             节点ID的拓扑排序列表
         """
-        # 构建邻接表和入度表
+        result, has_cycle = self._kahn(nodes, edges)
+        if has_cycle:
+            raise ValidationError("无法生成拓扑排序，图中可能存在环")
+            
+        return result
+    
+    @staticmethod
+    def _kahn(nodes: List[Dict], edges: List[List[str]]) -> Tuple[List[str], bool]:
+        """
+        Kahn拓扑排序（迭代实现，无递归深度限制）
+        
+        Returns:
+            (拓扑序, 是否存在环)；存在环时拓扑序只包含环之外可排出的节点
+        """
+        # 一次遍历边同时构建邻接表和入度表
         graph = defaultdict(list)
         in_degree = defaultdict(int)
         
@@ -249,22 +415,23 @@ class GraphValidator:
             graph[from_node].append(to_node)
             in_degree[to_node] += 1
             
-        # Kahn算法
-        queue = deque([node_id for node_id, degree in in_degree.items() if degree == 0])
+        result = GraphValidator._kahn_order(graph, in_degree)
+        return result, len(result) != len(nodes)
+    
+    @staticmethod
+    def _kahn_order(graph: Dict[str, List[str]], in_degree: Dict[str, int]) -> List[str]:
+        """在已构建的邻接表/入度表上执行Kahn算法（不修改in_degree）"""
+        remaining = dict(in_degree)
+        queue = deque([node_id for node_id, degree in remaining.items() if degree == 0])
         result = []
         
         while queue:
             node = queue.popleft()
             result.append(node)
             
-            for neighbor in graph[node]:
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
+            for neighbor in graph.get(node, ()):
+                remaining[neighbor] -= 1
+                if remaining[neighbor] == 0:
                     queue.append(neighbor)
                     
-        if len(result) != len(nodes):
-            raise ValidationError("无法生成拓扑排序，图中可能存在环")
-            
         return result
-
-
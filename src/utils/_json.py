@@ -0,0 +1,38 @@
+"""
+JSON读写工具 - TaskLogger、DatasetLoader 与 scripts 共用（优先使用orjson，未安装时回退到标准库json）
+"""
+import json
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时回退到标准库json
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为带缩进的UTF-8 JSON（非字符串键转换为字符串，与json.dump一致）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def dumps_line(obj: Any) -> bytes:
+    """序列化为单行UTF-8 JSON（含换行符），用于JSONL追加写入"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8') + b"\n"
+
+
+def write_json(path, obj: Any) -> None:
+    """以带缩进的UTF-8 JSON写入文件（直接写出字节）"""
+    Path(path).write_bytes(dumps(obj))
+
+
+def read_json(path) -> Any:
+    """读取UTF-8 JSON文件"""
+    data = Path(path).read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,12 +1,174 @@
 """
 数据集加载器 - 支持多种Web Agent Benchmark
 """
+import functools
 import json
+import logging
+import mmap
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 from enum import Enum
 
+from ._json import orjson, dumps_line as _dumps_line, write_json as _write_json
+
+logger = logging.getLogger("GraphWebAgent.data")
+
+
+# 超过该大小的JSON文件通过mmap交给orjson解析，不再额外复制一份文件内容
+_MMAP_MIN_SIZE = 1 << 20
+
+
+def _read_json(path: Path) -> Any:
+    """
+    读取JSON文件，解析结果按(路径, 修改时间, 大小)缓存
+    
+    同一文件未修改时重复读取直接返回缓存对象（调用方不应原地修改返回的结构）。
+    """
+    stat = path.stat()
+    return _read_json_cached(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=32)
+def _read_json_cached(path_str: str, mtime_ns: int, size: int) -> Any:
+    """解析JSON文件（mtime_ns/size只作为缓存键，文件被修改后自动失效）"""
+    path = Path(path_str)
+    if orjson is not None:
+        if size > _MMAP_MIN_SIZE:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # orjson直接解析内存映射的只读视图；视图须在关闭mmap前释放
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+        return orjson.loads(path.read_bytes())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 本进程内已确认存在的目录，避免每次写结果都重复 stat + mkdir
+_MKDIR_DONE: Set[str] = set()
+
+
+def _ensure_dir(path: Path) -> Path:
+    """创建目录（含父目录），同一路径在进程内只创建一次"""
+    key = str(path)
+    if key not in _MKDIR_DONE:
+        path.mkdir(parents=True, exist_ok=True)
+        _MKDIR_DONE.add(key)
+    return path
+
+
+# MiniWoB++任务名关键词 -> 类别（按优先级排列，先命中者生效）
+_MINIWOB_KEYWORDS = (
+    ("click", "click"),
+    ("text", "text_input"),
+    ("type", "text_input"),
+    ("search", "search"),
+    ("form", "form_filling"),
+    ("navigate", "navigation"),
+)
+
+
+@functools.lru_cache(maxsize=256)
+def _miniwob_category(task_name: str) -> str:
+    """按关键词优先级推断类别（MiniWoB++任务名只有约百种，结果按名称缓存）"""
+    name = task_name.lower()
+    return next((category for keyword, category in _MINIWOB_KEYWORDS if keyword in name), "other")
+
+
+# MiniWoB++任务统一的成功判据（各任务共享同一只读字典）
+_MINIWOB_SUCCESS = {"type": "miniwob_reward", "threshold": 1.0}
+
+# 示例任务（未找到数据文件时使用；返回给调用方的是浅拷贝）
+_MINIWOB_SAMPLE_TASKS = (
+    {
+        "task_id": "miniwob_click_test_001",
+        "instruction": "点击标记为'Submit'的按钮",
+        "start_url": "http://localhost:8000/click-test.html",
+        "task_type": "click-test",
+        "success_criteria": _MINIWOB_SUCCESS,
+        "category": "click",
+        "difficulty": "easy",
+        "max_steps": 10,
+        "timeout": 30,
+        "benchmark": "miniwob"
+    },
+    {
+        "task_id": "miniwob_click_button_001",
+        "instruction": "点击按钮",
+        "start_url": "http://localhost:8000/click-button.html",
+        "task_type": "click-button",
+        "success_criteria": _MINIWOB_SUCCESS,
+        "category": "click",
+        "difficulty": "easy",
+        "max_steps": 10,
+        "timeout": 30,
+        "benchmark": "miniwob"
+    },
+    {
+        "task_id": "miniwob_enter_text_001",
+        "instruction": "在文本框中输入'Hello World'",
+        "start_url": "http://localhost:8000/enter-text.html",
+        "task_type": "enter-text",
+        "success_criteria": _MINIWOB_SUCCESS,
+        "category": "text_input",
+        "difficulty": "easy",
+        "max_steps": 10,
+        "timeout": 30,
+        "benchmark": "miniwob"
+    }
+)
+
+_WEBARENA_SAMPLE_TASKS = (
+    {
+        "task_id": "webarena_001",
+        "instruction": "在Wikipedia上搜索'Python programming'并提取第一段内容",
+        "start_url": "https://www.wikipedia.org/",
+        "target_url": "https://en.wikipedia.org/wiki/Python_(programming_language)",
+        "success_criteria": {
+            "type": "text_match",
+            "expected": "Python is a high-level programming language"
+        },
+        "category": "wikipedia",
+        "difficulty": "medium",
+        "max_steps": 50,
+        "timeout": 180,
+        "benchmark": "webarena"
+    },
+)
+
+
+# 各Benchmark的说明信息（返回给调用方的是浅拷贝）
+_BENCHMARK_INFO = {
+    "miniwob": {
+        "name": "MiniWoB++",
+        "description": "小规模Web任务，适合快速测试",
+        "task_count": "100+",
+        "avg_steps": "5-15",
+        "avg_time": "10-30秒",
+        "difficulty": "简单",
+        "url": "https://miniwob.farama.org/"
+    },
+    "webarena": {
+        "name": "WebArena",
+        "description": "大规模真实网站任务",
+        "task_count": "812",
+        "avg_steps": "20-50",
+        "avg_time": "1-5分钟",
+        "difficulty": "中等到困难",
+        "url": "https://webarena.dev/"
+    },
+    "webchore": {
+        "name": "WebChoreArena",
+        "description": "日常Web任务",
+        "task_count": "300+",
+        "avg_steps": "15-40",
+        "avg_time": "30秒-3分钟",
+        "difficulty": "中等",
+        "url": "https://github.com/..."
+    }
+}
+
 
 class BenchmarkType(Enum):
     """Benchmark类型"""
@@ -51,11 +213,31 @@ class DatasetLoader:
         else:
             tasks = self._load_custom_tasks(split)
         
-        # 限制任务数量
+        # 限制任务数量；返回新列表，调用方增删不影响已缓存的解析结果（任务字典本身是共享的）
         if num_tasks is not None:
-            tasks = tasks[:num_tasks]
+            return tasks[:num_tasks]
         
-        return tasks
+        return list(tasks)
+    
+    def load_many(
+        self,
+        specs: List[Tuple[str, str, Optional[int]]]
+    ) -> Dict[str, List[Dict]]:
+        """
+        并行加载多个数据集（各数据集的读取与解析互不依赖，用线程池重叠文件I/O）
+        
+        Args:
+            specs: (benchmark, split, num_tasks) 列表，每个benchmark只应出现一次
+            
+        Returns:
+            benchmark -> 任务列表
+        """
+        if not specs:
+            return {}
+            
+        with ThreadPoolExecutor(max_workers=min(8, len(specs))) as executor:
+            loaded = list(executor.map(lambda spec: self.load_tasks(*spec), specs))
+        return {spec[0]: tasks for spec, tasks in zip(specs, loaded)}
     
     def _load_miniwob_tasks(self, split: str = "test") -> List[Dict]:
         """
@@ -70,25 +252,23 @@ class DatasetLoader:
         # 尝试从processed目录加载
         processed_file = self.data_dir / "processed" / f"miniwob_{split}.json"
         if processed_file.exists():
-            with open(processed_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("tasks", [])
+            data = _read_json(processed_file)
+            return data.get("tasks", [])
         
         # 尝试从raw目录加载
         raw_file = self.data_dir / "raw" / "miniwob" / "tasks.json"
         if raw_file.exists():
-            with open(raw_file, 'r', encoding='utf-8') as f:
-                tasks = json.load(f)
-                return self._convert_miniwob_format(tasks)
+            tasks = _read_json(raw_file)
+            return self._convert_miniwob_format(tasks)
         
         # 尝试从Gym注册表自动发现MiniWoB任务（无需JSON）
         registry_tasks = self._load_miniwob_from_registry()
         if registry_tasks:
-            print(f"信息: 从Gym注册表加载MiniWoB任务: {len(registry_tasks)} 个")
+            logger.info("从Gym注册表加载MiniWoB任务: %d 个", len(registry_tasks))
             return registry_tasks
 
         # 如果都不存在，返回示例任务
-        print(f"警告: 未找到MiniWoB++数据文件，且无法从Gym注册表读取，使用示例任务")
+        logger.warning("未找到MiniWoB++数据文件（%s），且无法从Gym注册表读取，使用示例任务", raw_file)
         return self._get_miniwob_sample_tasks()
     
     def _load_webarena_tasks(self, split: str = "test") -> List[Dict]:
@@ -102,37 +282,33 @@ class DatasetLoader:
         """
         processed_file = self.data_dir / "processed" / f"webarena_{split}.json"
         if processed_file.exists():
-            with open(processed_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("tasks", [])
+            data = _read_json(processed_file)
+            return data.get("tasks", [])
         
         raw_file = self.data_dir / "raw" / "webarena" / "tasks.json"
         if raw_file.exists():
-            with open(raw_file, 'r', encoding='utf-8') as f:
-                tasks = json.load(f)
-                return self._convert_webarena_format(tasks)
+            tasks = _read_json(raw_file)
+            return self._convert_webarena_format(tasks)
         
-        print(f"警告: 未找到WebArena数据文件，使用示例任务")
+        logger.warning("未找到WebArena数据文件（%s），使用示例任务", raw_file)
         return self._get_webarena_sample_tasks()
     
     def _load_webchore_tasks(self, split: str = "test") -> List[Dict]:
         """加载WebChoreArena任务"""
         processed_file = self.data_dir / "processed" / f"webchore_{split}.json"
         if processed_file.exists():
-            with open(processed_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("tasks", [])
+            data = _read_json(processed_file)
+            return data.get("tasks", [])
         
-        print(f"警告: 未找到WebChoreArena数据文件")
+        logger.warning("未找到WebChoreArena数据文件（%s）", processed_file)
         return []
     
     def _load_custom_tasks(self, split: str = "test") -> List[Dict]:
         """加载自定义任务"""
         custom_file = self.data_dir / "processed" / f"custom_{split}.json"
         if custom_file.exists():
-            with open(custom_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("tasks", [])
+            data = _read_json(custom_file)
+            return data.get("tasks", [])
         return []
     
     def _load_miniwob_from_registry(self) -> List[Dict]:
@@ -177,7 +353,7 @@ class DatasetLoader:
                 "instruction": f"完成 MiniWoB 任务: {env_id}",
                 "start_url": f"https://miniwob.farama.org/{task_name}.html",
                 "task_type": task_name,
-                "success_criteria": {"type": "miniwob_reward", "threshold": 1.0},
+                "success_criteria": _MINIWOB_SUCCESS,
                 "category": self._get_miniwob_category(task_name),
                 "difficulty": "easy",
                 "max_steps": 20,
@@ -196,120 +372,61 @@ class DatasetLoader:
 
     def _convert_miniwob_format(self, raw_tasks: List[Dict]) -> List[Dict]:
         """转换MiniWoB++格式为标准格式"""
-        converted = []
-        for task in raw_tasks:
-            converted.append({
-                "task_id": task.get("id", task.get("task_id")),
-                "instruction": task.get("utterance", task.get("instruction")),
-                "start_url": task.get("url", "http://localhost:8000"),  # MiniWoB++本地服务
-                "task_type": task.get("task", "unknown"),
-                "success_criteria": {
-                    "type": "miniwob_reward",
-                    "threshold": 1.0
-                },
-                "category": self._get_miniwob_category(task.get("task", "")),
-                "difficulty": "easy",  # MiniWoB++任务相对简单
-                "max_steps": 20,  # MiniWoB++任务步数较少
-                "timeout": 60,
-                "benchmark": "miniwob",
-                "metadata": task.get("metadata", {})
-            })
-        return converted
+        convert = self._convert_miniwob_row
+        return [convert(task) for task in raw_tasks]
     
     def _convert_webarena_format(self, raw_tasks: List[Dict]) -> List[Dict]:
         """转换WebArena格式为标准格式"""
-        converted = []
-        for task in raw_tasks:
-            converted.append({
-                "task_id": task.get("task_id"),
-                "instruction": task.get("intent", task.get("instruction")),
-                "start_url": task.get("start_url", ""),
-                "target_url": task.get("target_url", ""),
-                "success_criteria": task.get("eval", task.get("success_criteria", {})),
-                "category": task.get("sites", ["unknown"])[0] if isinstance(task.get("sites"), list) else "unknown",
-                "difficulty": task.get("difficulty", "medium"),
-                "max_steps": 100,  # WebArena任务步数较多
-                "timeout": 300,
-                "benchmark": "webarena",
-                "metadata": task.get("metadata", {})
-            })
-        return converted
+        convert = self._convert_webarena_row
+        return [convert(task) for task in raw_tasks]
+    
+    def _convert_miniwob_row(self, task: Dict) -> Dict:
+        """转换单条MiniWoB++任务（备用键只在主键缺失时才查找）"""
+        # 缺省的"unknown"不含任何类别关键词，推断结果与空名称相同（均为"other"）
+        task_type = task.get("task", "unknown")
+        return {
+            "task_id": task["id"] if "id" in task else task.get("task_id"),
+            "instruction": task["utterance"] if "utterance" in task else task.get("instruction"),
+            "start_url": task.get("url", "http://localhost:8000"),  # MiniWoB++本地服务
+            "task_type": task_type,
+            "success_criteria": _MINIWOB_SUCCESS,
+            "category": self._get_miniwob_category(task_type),
+            "difficulty": "easy",  # MiniWoB++任务相对简单
+            "max_steps": 20,  # MiniWoB++任务步数较少
+            "timeout": 60,
+            "benchmark": "miniwob",
+            "metadata": task.get("metadata", {})
+        }
+    
+    @staticmethod
+    def _convert_webarena_row(task: Dict) -> Dict:
+        """转换单条WebArena任务（备用键只在主键缺失时才查找）"""
+        sites = task.get("sites")
+        return {
+            "task_id": task.get("task_id"),
+            "instruction": task["intent"] if "intent" in task else task.get("instruction"),
+            "start_url": task.get("start_url", ""),
+            "target_url": task.get("target_url", ""),
+            "success_criteria": task["eval"] if "eval" in task else task.get("success_criteria", {}),
+            "category": sites[0] if isinstance(sites, list) else "unknown",
+            "difficulty": task.get("difficulty", "medium"),
+            "max_steps": 100,  # WebArena任务步数较多
+            "timeout": 300,
+            "benchmark": "webarena",
+            "metadata": task.get("metadata", {})
+        }
     
     def _get_miniwob_category(self, task_name: str) -> str:
         """根据任务名称推断MiniWoB++类别"""
-        if "click" in task_name.lower():
-            return "click"
-        elif "text" in task_name.lower() or "type" in task_name.lower():
-            return "text_input"
-        elif "search" in task_name.lower():
-            return "search"
-        elif "form" in task_name.lower():
-            return "form_filling"
-        elif "navigate" in task_name.lower():
-            return "navigation"
-        else:
-            return "other"
+        return _miniwob_category(task_name)
     
     def _get_miniwob_sample_tasks(self) -> List[Dict]:
         """获取MiniWoB++示例任务"""
-        return [
-            {
-                "task_id": "miniwob_click_test_001",
-                "instruction": "点击标记为'Submit'的按钮",
-                "start_url": "http://localhost:8000/click-test.html",
-                "task_type": "click-test",
-                "success_criteria": {"type": "miniwob_reward", "threshold": 1.0},
-                "category": "click",
-                "difficulty": "easy",
-                "max_steps": 10,
-                "timeout": 30,
-                "benchmark": "miniwob"
-            },
-            {
-                "task_id": "miniwob_click_button_001",
-                "instruction": "点击按钮",
-                "start_url": "http://localhost:8000/click-button.html",
-                "task_type": "click-button",
-                "success_criteria": {"type": "miniwob_reward", "threshold": 1.0},
-                "category": "click",
-                "difficulty": "easy",
-                "max_steps": 10,
-                "timeout": 30,
-                "benchmark": "miniwob"
-            },
-            {
-                "task_id": "miniwob_enter_text_001",
-                "instruction": "在文本框中输入'Hello World'",
-                "start_url": "http://localhost:8000/enter-text.html",
-                "task_type": "enter-text",
-                "success_criteria": {"type": "miniwob_reward", "threshold": 1.0},
-                "category": "text_input",
-                "difficulty": "easy",
-                "max_steps": 10,
-                "timeout": 30,
-                "benchmark": "miniwob"
-            }
-        ]
+        return [dict(task) for task in _MINIWOB_SAMPLE_TASKS]
     
     def _get_webarena_sample_tasks(self) -> List[Dict]:
         """获取WebArena示例任务"""
-        return [
-            {
-                "task_id": "webarena_001",
-                "instruction": "在Wikipedia上搜索'Python programming'并提取第一段内容",
-                "start_url": "https://www.wikipedia.org/",
-                "target_url": "https://en.wikipedia.org/wiki/Python_(programming_language)",
-                "success_criteria": {
-                    "type": "text_match",
-                    "expected": "Python is a high-level programming language"
-                },
-                "category": "wikipedia",
-                "difficulty": "medium",
-                "max_steps": 50,
-                "timeout": 180,
-                "benchmark": "webarena"
-            }
-        ]
+        return [dict(task) for task in _WEBARENA_SAMPLE_TASKS]
     
     def save_results(
         self, 
@@ -317,7 +434,7 @@ class DatasetLoader:
         benchmark: str,
         experiment_id: str,
         variant: str = "full_system"
-    ):
+    ) -> Dict:
         """
         保存实验结果
         
@@ -326,10 +443,10 @@ class DatasetLoader:
             benchmark: 数据集名称
             experiment_id: 实验ID
             variant: 实验变体
+            
+        Returns:
+            结果文件内容
         """
-        output_dir = self.data_dir / "output" / "predictions" / benchmark
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
         output_data = {
             "experiment_id": experiment_id,
             "benchmark": benchmark,
@@ -339,58 +456,120 @@ class DatasetLoader:
             "summary": self._compute_summary(results)
         }
         
-        file_path = output_dir / f"{experiment_id}_{variant}.json"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        file_path = self._results_path(benchmark, experiment_id, variant, ".json")
+        _write_json(file_path, output_data)
         
         print(f"结果已保存: {file_path}")
+        return output_data
+    
+    def _results_path(self, benchmark: str, experiment_id: str, variant: str, suffix: str) -> Path:
+        """实验结果文件路径（自动创建目录）"""
+        output_dir = _ensure_dir(self.data_dir / "output" / "predictions" / benchmark)
+        return output_dir / f"{experiment_id}_{variant}{suffix}"
+    
+    def append_result(
+        self,
+        result: Dict,
+        benchmark: str,
+        experiment_id: str,
+        variant: str = "full_system"
+    ) -> Path:
+        """
+        追加一条实验结果到 {experiment_id}_{variant}.jsonl
+        
+        每条结果写完即落盘，内存中无需保留全部结果，实验中断时已完成的结果不会丢失。
+        
+        Returns:
+            JSONL文件路径
+        """
+        file_path = self._results_path(benchmark, experiment_id, variant, ".jsonl")
+        with open(file_path, 'ab') as f:
+            f.write(_dumps_line(result))
+        return file_path
     
-    def _compute_summary(self, results: List[Dict]) -> Dict:
+    def finalize_results(
+        self,
+        benchmark: str,
+        experiment_id: str,
+        variant: str = "full_system"
+    ) -> Path:
+        """
+        读取append_result写入的JSONL，写出与 save_results 相同字段的 {experiment_id}_{variant}.json
+        
+        结果逐行从JSONL读出并直接写入结果文件，摘要在同一次遍历中计算，
+        不在内存中保留全部结果（total_tasks与summary写在results之后）。
+        JSONL文件保留，实验中断时已完成的结果仍可从中读取。
+        
+        Returns:
+            结果文件路径
+        """
+        results_path = self._results_path(benchmark, experiment_id, variant, ".jsonl")
+        file_path = self._results_path(benchmark, experiment_id, variant, ".json")
+        header = (("experiment_id", experiment_id), ("benchmark", benchmark), ("variant", variant))
+        count = 0
+        
+        with open(file_path, 'wb') as f:
+            f.write(b'{\n')
+            for key, value in header:
+                f.write(b'  "' + key.encode('utf-8') + b'": ' + _dumps_line(value).rstrip() + b',\n')
+            f.write(b'  "results": [')
+            
+            def stream() -> Iterator[Dict]:
+                nonlocal count
+                if not results_path.exists():
+                    return
+                for result in self.load_results_jsonl(results_path):
+                    f.write((b',\n    ' if count else b'\n    ') + _dumps_line(result).rstrip())
+                    count += 1
+                    yield result
+            
+            summary = self._summarize(stream())
+            f.write(b'\n  ],\n  "total_tasks": %d,\n  "summary": ' % count)
+            f.write(_dumps_line(summary).rstrip() + b'\n}\n')
+        
+        print(f"结果已保存: {file_path}")
+        return file_path
+    
+    @staticmethod
+    def load_results_jsonl(path) -> Iterator[Dict]:
+        """逐行读取JSONL结果文件（跳过空行）"""
+        loads = orjson.loads if orjson is not None else json.loads
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+    
+    def _compute_summary(self, results: Iterable[Dict]) -> Dict:
         """计算结果摘要"""
-        if not results:
+        return self._summarize(results)
+    
+    @staticmethod
+    def _summarize(results: Iterable[Dict]) -> Dict:
+        """一次遍历结果（可以是生成器）计算摘要"""
+        count = 0
+        success_count = 0
+        total_steps = 0
+        total_cost = 0
+        for r in results:
+            get = r.get
+            count += 1
+            if get("success", False):
+                success_count += 1
+            total_steps += get("steps", 0)
+            total_cost += get("cost", 0)
+            
+        if not count:
             return {}
         
-        success_count = sum(1 for r in results if r.get("success", False))
-        total_steps = sum(r.get("steps", 0) for r in results)
-        total_cost = sum(r.get("cost", 0) for r in results)
-        
         return {
-            "success_rate": success_count / len(results) if results else 0,
-            "avg_steps": total_steps / len(results) if results else 0,
-            "avg_cost": total_cost / len(results) if results else 0,
+            "success_rate": success_count / count,
+            "avg_steps": total_steps / count,
+            "avg_cost": total_cost / count,
             "total_cost": total_cost
         }
     
     def get_benchmark_info(self, benchmark: str) -> Dict:
         """获取Benchmark信息"""
-        info = {
-            "miniwob": {
-                "name": "MiniWoB++",
-                "description": "小规模Web任务，适合快速测试",
-                "task_count": "100+",
-                "avg_steps": "5-15",
-                "avg_time": "10-30秒",
-                "difficulty": "简单",
-                "url": "https://miniwob.farama.org/"
-            },
-            "webarena": {
-                "name": "WebArena",
-                "description": "大规模真实网站任务",
-                "task_count": "812",
-                "avg_steps": "20-50",
-                "avg_time": "1-5分钟",
-                "difficulty": "中等到困难",
-                "url": "https://webarena.dev/"
-            },
-            "webchore": {
-                "name": "WebChoreArena",
-                "description": "日常Web任务",
-                "task_count": "300+",
-                "avg_steps": "15-40",
-                "avg_time": "30秒-3分钟",
-                "difficulty": "中等",
-                "url": "https://github.com/..."
-            }
-        }
-        return info.get(benchmark.lower(), {})
+        info = _BENCHMARK_INFO.get(benchmark.lower())
+        return dict(info) if info else {}
 
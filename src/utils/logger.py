@@ -3,9 +3,12 @@ Logger - 日志工具
 """
 import logging
 import json
+import time
+from collections import Counter
 from pathlib import Path
 from typing import Dict, Any
-from datetime import datetime
+
+from ._json import dumps_line as _dumps_line, write_json as _write_json
 
 
 class TaskLogger:
@@ -23,11 +26,17 @@ class TaskLogger:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         console_formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            '{asctime} - {name} - {levelname} - {message}', style='{'
         )
+        # 时间戳不拼接毫秒，省去每条记录的一次额外格式化
+        console_formatter.default_msec_format = None
         console_handler.setFormatter(console_formatter)
         self.logger.addHandler(console_handler)
         
+        # 任务结果追加写入同一个JSONL文件，首次写入时打开
+        self.results_path = self.log_dir / "task_results.jsonl"
+        self._results_fh = None
+        
     def log_task_start(self, task_id: str, task_description: str) -> None:
         """记录任务开始"""
         self.logger.info(f"任务开始: {task_id}")
@@ -57,23 +66,42 @@ class TaskLogger:
         
     def log_cost(self, stats: Dict[str, Any]) -> None:
         """记录成本统计"""
-        self.logger.info(f"成本统计: {json.dumps(stats, indent=2, ensure_ascii=False)}")
+        # 日志级别过滤掉INFO时跳过JSON编码
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("成本统计: %s", json.dumps(stats, indent=2, ensure_ascii=False))
         
     def _save_task_result(self, task_id: str, result: Dict[str, Any]) -> None:
-        """保存任务结果到文件"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self.log_dir / f"{task_id}_{timestamp}.json"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        """追加任务结果到 task_results.jsonl（每行一个任务，ts为纳秒时间戳）"""
+        if self._results_fh is None:
+            # 无缓冲：每条记录恰好一次write()系统调用，进程中断时已写入的结果不会滞留在缓冲区
+            self._results_fh = open(self.results_path, 'ab', buffering=0)
+        self._results_fh.write(_dumps_line({"task_id": task_id, "ts": time.time_ns(), "result": result}))
+        
+        self.logger.info(f"结果已保存: {self.results_path}")
+        
+    def close(self) -> None:
+        """刷新并关闭结果文件"""
+        if self._results_fh is not None:
+            self._results_fh.close()
+            self._results_fh = None
             
-        self.logger.info(f"结果已保存: {filename}")
+    def __enter__(self) -> "TaskLogger":
+        return self
+        
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
 
 
 class MetricsCollector:
     """指标收集器"""
     
-    def __init__(self):
+    def __init__(self, keep_repair_depths: bool = True):
+        """
+        Args:
+            keep_repair_depths: 是否保留每次的修复深度原始列表（analyze_results用它统计深度分布）；
+                关闭后只维护累计和与次数，内存不随修复次数增长
+        """
+        self.keep_repair_depths = keep_repair_depths
         self.metrics = {
             "success_count": 0,
             "failure_count": 0,
@@ -81,10 +109,13 @@ class MetricsCollector:
             "total_llm_calls": 0,
             "total_cost": 0.0,
             "total_duration": 0.0,
-            "failure_types": {},
+            "failure_types": Counter(),
             "repair_depths": [],
             "tasks": []
         }
+        # 修复深度的累计和与次数，汇总时无需遍历repair_depths
+        self._repair_depth_total = 0
+        self._repair_depth_count = 0
         
     def record_task(self, result: Dict[str, Any]) -> None:
         """记录任务结果"""
@@ -111,16 +142,18 @@ class MetricsCollector:
         
     def record_failure(self, failure_type: str) -> None:
         """记录失败类型"""
-        if failure_type not in self.metrics["failure_types"]:
-            self.metrics["failure_types"][failure_type] = 0
         self.metrics["failure_types"][failure_type] += 1
         
     def record_repair_depth(self, depth: int) -> None:
         """记录修复深度"""
-        self.metrics["repair_depths"].append(depth)
+        if self.keep_repair_depths:
+            self.metrics["repair_depths"].append(depth)
+        self._repair_depth_total += depth
+        self._repair_depth_count += 1
         
     def get_summary(self) -> Dict[str, Any]:
         """获取汇总统计"""
+        # 各项总量都在record_*时累加，这里只有常数次除法，不随任务数增长
         total_tasks = self.metrics["success_count"] + self.metrics["failure_count"]
         
         summary = {
@@ -145,10 +178,10 @@ class MetricsCollector:
                 self.metrics["total_duration"] / total_tasks
                 if total_tasks > 0 else 0
             ),
-            "failure_distribution": self.metrics["failure_types"],
+            "failure_distribution": dict(self.metrics["failure_types"]),
             "avg_repair_depth": (
-                sum(self.metrics["repair_depths"]) / len(self.metrics["repair_depths"])
-                if self.metrics["repair_depths"] else 0
+                self._repair_depth_total / self._repair_depth_count
+                if self._repair_depth_count > 0 else 0
             )
         }
         
@@ -159,7 +192,6 @@ class MetricsCollector:
         summary = self.get_summary()
         summary["raw_metrics"] = self.metrics
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        _write_json(filepath, summary)
 
 